@@ -1,11 +1,43 @@
 import os
 import logging
+import sys
 import time
 import requests
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from dotenv import load_dotenv
+from http_pool import get_session, warm_session
+from log_events import configure_logging
+from body_encoding import (
+    DecompressRequestMiddleware,
+    check_compression,
+    compression_settings,
+    encode_json_body,
+)
+import json_codec
+
+
+class CodecJSONProvider(JSONProvider):
+    """
+    Flask JSON provider for `request.json` and `jsonify` backed by `json_codec`.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(obj).decode("utf8")
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            json_codec.dumps(obj), mimetype="application/json"
+        )
+
 
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
+app.wsgi_app = DecompressRequestMiddleware(app.wsgi_app)
 
 ENRICHMENT_URL = os.getenv("ENRICHMENT_URL")
 ANALYTICS_URL = os.getenv("ANALYTICS_URL")
@@ -14,17 +46,46 @@ AUTH_HEADER = {"Authorization": "eye-am-hiring"}
 enriched_records = []
 non_enriched_records = []
 failed_records = []
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 LAST_SENT_MESSAGE_TIME = 0
 RATE_LIMIT_INTERVAL = 10
 
 
+def warm_connection_pools():
+    """
+    Open the enrichment connection before the first record arrives.
+
+    Called on startup once the environment is loaded, not on import, so that
+    importing the app (workers, the reloader, tests) does not send requests. Other
+    servers can call it when a worker starts, e.g. from gunicorn's post_fork hook.
+    The rate-limited analytics service is not warmed, since each request counts.
+    """
+    enrichment_url = os.getenv("ENRICHMENT_URL")
+    if enrichment_url:
+        warm_session("ENRICHMENT", enrichment_url, headers=AUTH_HEADER)
+
+
+def check_configuration():
+    """
+    Check the settings read from the environment, exiting with status 1 if one is invalid.
+
+    Called on startup once the environment is loaded, so that an invalid setting
+    fails there rather than on the first request.
+    """
+    try:
+        check_compression(compression_settings("ANALYTICS")["compression"])
+    except (ValueError, RuntimeError) as err:
+        logger.error(f"ANALYTICS_COMPRESSION: {err}")
+        sys.exit(1)
+    try:
+        json_codec.load_codec()
+    except (ValueError, ImportError) as err:
+        logger.error(f"JSON_BACKEND: {err}")
+        sys.exit(1)
+
+
 def enrich_record(record, max_retries=3, retry_wait=0.5):
     """
     Send enriched records to analytics.
@@ -33,32 +94,44 @@ def enrich_record(record, max_retries=3, retry_wait=0.5):
         max_retries : number of retries to enrich a record when the enrichment fails
         retry_wait : waiting time between retries
     """
+    # Serialized once for all attempts
+    body = json_codec.dumps(record)
+    headers = {**AUTH_HEADER, "Content-Type": "application/json"}
     retries = 0
     while retries < max_retries:
         try:
-            response = requests.post(
-                url=ENRICHMENT_URL, json=record, headers=AUTH_HEADER, timeout=10
+            response = get_session("ENRICHMENT").post(
+                url=ENRICHMENT_URL, data=body, headers=headers
             )
             response.raise_for_status()
 
-            enrichment_data = response.json()
+            enrichment_data = json_codec.loads(response.content)
             record.update(enrichment_data)  # Merge the enrichment data into the record
             return record, 200  # Success
 
         except requests.exceptions.HTTPError as err:
             logger.error(
-                f"Enrichment service HTTP error: {err}, retrying {retries + 1}/{max_retries}"
+                "Enrichment service HTTP error: %s, retrying %d/%d",
+                err,
+                retries + 1,
+                max_retries,
             )
             retries += 1
 
         except requests.exceptions.Timeout as err:
-            logger.error(f"Timeout error: {err}, retrying {retries + 1}/{max_retries}")
+            logger.error(
+                "Timeout error: %s, retrying %d/%d", err, retries + 1, max_retries
+            )
             retries += 1
 
         time.sleep(retry_wait)
 
     # If it fails after max retries, add to failed_records for future retry
-    logger.error(f"Failed to enrich record after {max_retries} attempts: {record}")
+    logger.error(
+        "Failed to enrich record ID %s after %d attempts",
+        record.get("id"),
+        max_retries,
+    )
     failed_records.append(record)
     return None, 500
 
@@ -75,18 +148,19 @@ def send_to_analytics_service(record):
     if time_since_last < RATE_LIMIT_INTERVAL:
         time.sleep(RATE_LIMIT_INTERVAL - time_since_last)
 
+    body, headers = encode_json_body(record, **compression_settings("ANALYTICS"))
     try:
-        response = requests.post(
-            url=ANALYTICS_URL, json=record, headers=AUTH_HEADER, timeout=10
+        response = get_session("ANALYTICS").post(
+            url=ANALYTICS_URL, data=body, headers={**AUTH_HEADER, **headers}
         )
         response.raise_for_status()
         LAST_SENT_MESSAGE_TIME = time.time()
-        return response.json(), 200
+        return json_codec.loads(response.content), 200
     except requests.exceptions.HTTPError as err:
-        logger.error(f"Analytics service HTTP error: {err}")
+        logger.error("Analytics service HTTP error: %s", err)
         return None, 500
     except requests.exceptions.Timeout as err:
-        logger.error(f"Analytics service timeout error: {err}")
+        logger.error("Analytics service timeout error: %s", err)
         return None, 408
 
 
@@ -97,7 +171,7 @@ def retry_failed_records():
     if not failed_records:
         return
 
-    logger.info(f"Retrying {len(failed_records)} failed records...")
+    logger.info("Retrying %d failed records...", len(failed_records))
     records_to_retry = failed_records.copy()
     for record in records_to_retry:
         enriched_record, status_code = enrich_record(record)
@@ -105,13 +179,17 @@ def retry_failed_records():
             failed_records.remove(record)  # Remove successfully enriched record
             enriched_records.append(enriched_record)
         else:
-            logger.error(f"Failed to enrich record again: {record}")
-
+            logger.error("Failed to enrich record ID %s again", record.get("id"))
 
-@app.route("/process_record", methods=["POST"])
-def process_record():
-    record = request.json
 
+def handle_record(record):
+    """
+    Enrich a record and send the enriched records to analytics once 20 are collected.
+    Args:
+        record (dict): The record received by the microservice.
+    Returns:
+        tuple: (response body (dict), HTTP status code)
+    """
     enriched_record, status_code = enrich_record(record)
     if status_code == 200:
         enriched_records.append(enriched_record)
@@ -127,21 +205,51 @@ def process_record():
 
         if status_code == 200:
             retry_failed_records()  # Retry failed records after sending current batch
-            return (
-                jsonify(
-                    {"status": "success", "analytics_response": analytics_response}
-                ),
-                200,
-            )
+            return {"status": "success", "analytics_response": analytics_response}, 200
+
+        return {"status": "failure", "message": "Failed to send to analytics"}, 500
+
+    return {"status": "success", "message": "Records processed"}, 200
+
+
+@app.route("/process_record", methods=["POST"])
+def process_record():
+    body, status_code = handle_record(request.json)
+    return jsonify(body), status_code
+
 
+@app.route("/process_records", methods=["POST"])
+def process_records():
+    records = request.json
+    # Checked before any record is processed, so that a rejected batch can be resent
+    if not isinstance(records, list) or not all(
+        isinstance(record, dict) for record in records
+    ):
         return (
-            jsonify({"status": "failure", "message": "Failed to send to analytics"}),
-            500,
+            jsonify(
+                {
+                    "status": "failure",
+                    "message": "Expected a JSON array of record objects",
+                }
+            ),
+            400,
         )
 
-    return jsonify({"status": "success", "message": "Records processed"}), 200
+    results = []
+    for record in records:
+        body, status_code = handle_record(record)
+        results.append({"id": record.get("id"), "status_code": status_code, **body})
+
+    return jsonify({"status": "success", "results": results}), 200
 
 
 if __name__ == "__main__":
     load_dotenv()
-    app.run(host="0.0.0.0", port=5000)
+    check_configuration()
+    warm_connection_pools()
+    socket_path = os.getenv("MICROSERVICE_SOCKET")
+    if socket_path:
+        # For a CLI on the same host, e.g. MICROSERVICE_PATH=unix://<socket>:/process_record
+        app.run(host=f"unix://{socket_path}")
+    else:
+        app.run(host="0.0.0.0", port=5000)
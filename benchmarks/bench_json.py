@@ -0,0 +1,76 @@
+"""
+Benchmark serializing and parsing an enriched record with each installed JSON backend.
+
+Usage:
+    python benchmarks/bench_json.py --records 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from json_codec import available_codecs  # noqa: E402
+
+ANALYTICS_BATCH_SIZE = 20
+
+
+def enriched_record(index: int):
+    """
+    A record as sent to analytics: a normalized CSV row merged with its enrichment.
+    """
+    return {
+        "id": index,
+        "category": "phishing",
+        "asset": f"srv-{index % 500}",
+        "ip": f"10.0.{index % 256}.{index % 251}",
+        "user": f"user{index % 1000}",
+        "enrichment": {
+            "country": "FR",
+            "asn": 64512 + index % 100,
+            "reputation": 0.25 + (index % 4) / 10,
+            "tags": ["tor-exit", "scanner"],
+            "first_seen": "2024-05-01T12:00:00Z",
+        },
+    }
+
+
+def measure(function, payloads):
+    start = time.perf_counter()
+    for payload in payloads:
+        function(payload)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    records = [enriched_record(index) for index in range(args.records)]
+    batches = [
+        records[start : start + ANALYTICS_BATCH_SIZE]
+        for start in range(0, len(records), ANALYTICS_BATCH_SIZE)
+    ]
+
+    results = {}
+    for name, (dumps, loads) in available_codecs().items():
+        serialize = measure(dumps, records)
+        parse = measure(loads, [dumps(record) for record in records])
+        batch_serialize = measure(dumps, batches)
+        results[name] = serialize + parse
+        print(
+            f"{name:>6}: serialize {serialize / args.records * 1e6:.2f} us/record, "
+            f"parse {parse / args.records * 1e6:.2f} us/record, "
+            f"batch of {ANALYTICS_BATCH_SIZE} "
+            f"{batch_serialize / args.records * 1e6:.2f} us/record"
+        )
+
+    fastest = min(results, key=results.get)
+    print(f"speedup of {fastest} over json: {results['json'] / results[fastest]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
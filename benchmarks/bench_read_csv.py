@@ -0,0 +1,203 @@
+"""
+Benchmark read_csv_file and the mmap reader against the original row-by-row
+DictReader implementation.
+
+The readers are also run over a file where most rows have an invalid category, each
+in a fresh process to report its CPU time and peak RSS.
+
+Usage:
+    python benchmarks/bench_read_csv.py --rows 1000000 --invalid-share 0.9
+"""
+
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cli_ingestion import peak_rss_mb, read_csv_file, read_csv_file_mmap  # noqa: E402
+
+logger = logging.getLogger("cli_ingestion")
+
+CATEGORIES = [
+    "Phishing",
+    "Valid Accounts",
+    "supply-chain-compromise",
+    "Drive-by Compromise",
+    "Trusted Relationship",
+    "Reconnaissance",
+    "Resource Development",
+]
+VALID_CATEGORIES = CATEGORIES[:5]
+INVALID_CATEGORIES = CATEGORIES[5:]
+
+
+def legacy_check_filter_values(row: dict, filter_values: list):
+    for filter_value in filter_values:
+        if filter_value in row.values():
+            return True
+    return False
+
+
+def legacy_read_csv_file(file_path: str, filter_values: list = None):
+    """
+    The read_csv_file implementation before the row normalization was compiled.
+    """
+    valid_category = [
+        "contentinjection",
+        "drivebycompromise",
+        "exploitpublicfacingapplication",
+        "externalremoteservices",
+        "hardwareadditions",
+        "phishing",
+        "replicationthroughremovablemedia",
+        "supplychaincompromise",
+        "trustedrelationship",
+        "validaccounts",
+    ]
+    with open(file=file_path, mode="r", encoding="utf8") as csvfile:
+        reader = csv.DictReader(f=csvfile, delimiter=";")
+        for row in reader:
+            if "created_utc" in row:
+                del row["created_utc"]
+            if "source" in row:
+                del row["source"]
+            if "asset_name" in row:
+                row["asset"] = row.pop("asset_name")
+            if "id" in row:
+                row["id"] = int(row.pop("id"))
+
+            if "category" in row and isinstance(row["category"], str):
+                row["category"] = re.sub("[^A-Za-z]", "", row["category"]).lower()
+
+            if row["category"] not in valid_category:
+                logger.debug(f"Skipping invalid category: {row['category']}")
+                continue
+
+            if filter_values is None or legacy_check_filter_values(
+                row=row, filter_values=filter_values
+            ):
+                logger.debug(f"Record passed filter: {row['id']}")
+                yield row
+            else:
+                logger.debug(f"Record filtered out: {row['id']}")
+
+
+def write_sample_csv(file_path: str, rows: int, invalid_share: float = None):
+    """
+    Write a CSV file shaped like our exports, with a mix of valid and invalid categories.
+
+    Args:
+        file_path (str): The path of the file to write.
+        rows (int): The number of rows.
+        invalid_share (float, optional): The share of rows with an invalid category.
+        Categories are drawn uniformly if None.
+    """
+    rng = random.Random(42)
+    with open(file=file_path, mode="w", encoding="utf8", newline="") as csvfile:
+        writer = csv.writer(csvfile, delimiter=";")
+        writer.writerow(
+            ["id", "created_utc", "source", "category", "asset_name", "ip", "user"]
+        )
+        for index in range(rows):
+            if invalid_share is None:
+                category = rng.choice(CATEGORIES)
+            elif rng.random() < invalid_share:
+                category = rng.choice(INVALID_CATEGORIES)
+            else:
+                category = rng.choice(VALID_CATEGORIES)
+            writer.writerow(
+                [
+                    index,
+                    "2024-05-01T12:00:00Z",
+                    "sensor",
+                    category,
+                    f"srv-{index % 500}",
+                    f"10.0.{index % 256}.{index % 251}",
+                    f"user{index % 1000}",
+                ]
+            )
+
+
+def measure(reader, file_path: str, filter_values: list = None):
+    start = time.perf_counter()
+    passed = sum(1 for _ in reader(file_path, filter_values))
+    return passed, time.perf_counter() - start
+
+
+def measure_resources(reader_name: str, file_path: str, filter_values: list = None):
+    """
+    Read a file in the current process, which should be fresh so that its peak RSS
+    is the reader's.
+
+    Returns:
+        tuple: (records passed, CPU seconds, peak RSS in MB)
+    """
+    logger.setLevel(logging.INFO)
+    reader = {"after": read_csv_file, "mmap": read_csv_file_mmap}[reader_name]
+    start = time.process_time()
+    passed = sum(1 for _ in reader(file_path, filter_values))
+    return passed, time.process_time() - start, peak_rss_mb()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--filter", nargs="+", default=None)
+    parser.add_argument(
+        "--invalid-share",
+        type=float,
+        default=0.9,
+        help="Share of rows with an invalid category in the mostly filtered file",
+    )
+    args = parser.parse_args()
+
+    # Per-row debug logs would dominate both measurements
+    logger.setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "sample.csv")
+        write_sample_csv(file_path, args.rows)
+
+        results = {}
+        for name, reader in (
+            ("before", legacy_read_csv_file),
+            ("after", read_csv_file),
+            ("mmap", read_csv_file_mmap),
+        ):
+            passed, elapsed = measure(reader, file_path, args.filter)
+            results[name] = elapsed
+            print(
+                f"{name:>6}: {args.rows / elapsed:>12,.0f} rows/s "
+                f"({elapsed:.2f}s, {passed} records passed)"
+            )
+
+        print(f"speedup: {results['before'] / results['after']:.2f}x")
+
+        write_sample_csv(file_path, args.rows, args.invalid_share)
+        print(
+            f"mostly filtered, {args.invalid_share:.0%} invalid categories "
+            f"({os.path.getsize(file_path) / (1024 * 1024):.0f} MB):"
+        )
+        spawn = multiprocessing.get_context("spawn")
+        for name in ("after", "mmap"):
+            with spawn.Pool(1) as pool:
+                passed, cpu_time, peak_rss = pool.apply(
+                    measure_resources, (name, file_path, args.filter)
+                )
+            print(
+                f"{name:>6}: {args.rows / cpu_time:>12,.0f} rows/s of CPU "
+                f"({cpu_time:.2f}s, peak RSS {peak_rss:.0f} MB, "
+                f"{passed} records passed)"
+            )
+
+
+if __name__ == "__main__":
+    main()
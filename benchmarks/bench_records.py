@@ -0,0 +1,86 @@
+"""
+Benchmark the memory held by buffered records, and their serialization, as compact
+records against per-row dicts.
+
+Usage:
+    python benchmarks/bench_records.py --rows 200000 --batch-size 100
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import cli_ingestion  # noqa: E402
+import json_codec  # noqa: E402
+from bench_read_csv import write_sample_csv  # noqa: E402
+from record_type import record_type  # noqa: E402
+
+
+def buffer_records(file_path: str):
+    """
+    Read all the records of a file into a list, as when they are buffered for
+    batching or retries.
+
+    Returns:
+        tuple: (records, seconds spent reading, bytes held, memory blocks held)
+    """
+    started = time.perf_counter()
+    records = list(cli_ingestion.read_csv_file(file_path))
+    elapsed = time.perf_counter() - started
+    del records
+
+    # Read again, tracing allocations, which slows reading down
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    records = list(cli_ingestion.read_csv_file(file_path))
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, elapsed, held, sys.getallocatedblocks() - blocks
+
+
+def serialize(records: list, batch_size: int):
+    started = time.perf_counter()
+    for start in range(0, len(records), batch_size):
+        json_codec.dumps(records[start : start + batch_size])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "sample.csv")
+        write_sample_csv(file_path, args.rows)
+
+        results = {}
+        for name, factory in (("dict", lambda keys: None), ("record", record_type)):
+            # Without a record type, the transform builds dicts
+            cli_ingestion.record_type = factory
+            records, read_time, held, blocks = buffer_records(file_path)
+            dumps_time = serialize(records, args.batch_size)
+            results[name] = held
+            print(
+                f"{name:>6}: {held / len(records):6.0f} bytes/record, "
+                f"{blocks / len(records):4.1f} blocks/record, "
+                f"read {read_time:.2f}s, serialize {dumps_time:.2f}s "
+                f"({len(records)} records, {json_codec.BACKEND})"
+            )
+            del records
+
+    print(
+        f"memory held, record vs dict: {results['dict'] / results['record']:.2f}x less"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark CLI startup with -X importtime and fail if it regresses past a budget.
+
+Each path is run in a fresh interpreter several times. The median import time of
+cli_ingestion must stay within --budget-ms, and `import cli_ingestion`, --help and
+--dry-run must not load the HTTP stack, which is only imported to send records.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 80
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CLI = os.path.join(ROOT, "cli_ingestion.py")
+
+# Modules that would mean the HTTP stack or an engine was loaded eagerly
+FORBIDDEN_MODULES = (
+    "requests",
+    "urllib3",
+    "aiohttp",
+    "asyncio",
+    "http_pool",
+    "multiprocessing",
+    "concurrent.futures",
+)
+CSV_ROWS = (
+    "id;created_utc;source;category;asset_name;ip\n"
+    "1;2024-01-01;src;Phishing;srv-1;10.0.0.1\n"
+    "2;2024-01-01;src;Valid Accounts;srv-2;10.0.0.2\n"
+)
+
+
+def import_times(argv: list):
+    """
+    Run a Python command with -X importtime.
+
+    Returns:
+        tuple: (time in microseconds spent importing modules once the interpreter
+        has started, i.e. after site, set of the names of all the modules imported)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    modules = set()
+    started = False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        name = module.strip()
+        modules.add(name)
+        # Top-level imports have no indentation beyond the separator's space
+        if module[1:2] != " ":
+            if started:
+                total += int(cumulative)
+            started = started or name == "site"
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=80.0,
+        help="Maximum median import time of cli_ingestion, in milliseconds",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, "startup.csv")
+        with open(file=csv_path, mode="w", encoding="utf8") as csv_file:
+            csv_file.write(CSV_ROWS)
+
+        paths = {
+            "import": ["-c", "import cli_ingestion"],
+            "--help": [CLI, "--help"],
+            "--dry-run": [CLI, csv_path, "--dry-run", "--log-level", "WARNING"],
+        }
+        failures = []
+        for name, argv in paths.items():
+            runs = [import_times(argv) for _ in range(args.runs)]
+            median_ms = statistics.median(total for total, _ in runs) / 1000
+            loaded = sorted(
+                module for module in FORBIDDEN_MODULES if module in runs[0][1]
+            )
+            print(f"{name:>10}: {median_ms:7.1f}ms median import time, loads {loaded}")
+            if loaded:
+                failures.append(f"{name} loads {', '.join(loaded)}")
+            if median_ms > args.budget_ms:
+                failures.append(
+                    f"{name} imports in {median_ms:.1f}ms, over the "
+                    f"{args.budget_ms:.0f}ms budget"
+                )
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}", file=sys.stderr)
+        sys.exit(1)
+    print(f"OK: within the {args.budget_ms:.0f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark request latency to a co-located service over loopback TCP and a Unix socket.
+
+A minimal keep-alive HTTP server runs in another process and answers both
+transports, so the difference measured is the cost of the network stack.
+
+Usage:
+    python benchmarks/bench_transport.py --requests 20000 --concurrency 64
+"""
+
+import argparse
+import logging
+import math
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cli_ingestion import send_request_to_microservice  # noqa: E402
+from http_pool import get_session  # noqa: E402
+
+RECORD = {
+    "id": 1,
+    "category": "phishing",
+    "asset": "srv-1",
+    "ip": "10.0.0.1",
+    "user": "user1",
+}
+RESPONSE = b'{"status":"success","message":"Records processed"}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def address_string(self):
+        return "local"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def get_request(self):
+        connection, address = super().get_request()
+        # Headers and body are written separately; Nagle would delay the body
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection, address
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(server_class, address):
+    server_class(address, Handler).serve_forever()
+
+
+def measure(url: str, requests: int, concurrency: int):
+    """
+    Send `requests` records with `concurrency` threads.
+
+    Returns:
+        tuple: (requests per second, sorted list of latencies in seconds)
+    """
+    os.environ["MICROSERVICE_PATH"] = url
+
+    def send(_):
+        started = time.perf_counter()
+        if not send_request_to_microservice(RECORD):
+            raise RuntimeError(f"Request to {url} failed")
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Open the pooled connections before measuring
+        list(executor.map(send, range(concurrency)))
+        started = time.perf_counter()
+        latencies = sorted(executor.map(send, range(requests)))
+        elapsed = time.perf_counter() - started
+    return requests / elapsed, latencies
+
+
+def percentile(latencies: list, percent: float):
+    return latencies[max(math.ceil(len(latencies) * percent / 100) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    # Failures would be logged per request
+    logging.getLogger("cli_ingestion").setLevel(logging.CRITICAL)
+    os.environ["MICROSERVICE_POOL_SIZE"] = str(args.concurrency)
+    get_session("MICROSERVICE", min_pool_size=args.concurrency)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "bench.sock")
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+
+        servers = [
+            multiprocessing.Process(
+                target=serve, args=(TCPServer, ("127.0.0.1", port)), daemon=True
+            ),
+            multiprocessing.Process(
+                target=serve, args=(UnixServer, socket_path), daemon=True
+            ),
+        ]
+        for server in servers:
+            server.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+        time.sleep(0.2)
+
+        try:
+            results = {}
+            for name, url in (
+                ("tcp", f"http://127.0.0.1:{port}/process_record"),
+                ("unix", f"unix://{socket_path}:/process_record"),
+            ):
+                throughput, latencies = measure(url, args.requests, args.concurrency)
+                results[name] = percentile(latencies, 50)
+                print(
+                    f"{name:>4}: {throughput:>9,.0f} requests/s, "
+                    f"p50 {percentile(latencies, 50) * 1000:.3f}ms, "
+                    f"p95 {percentile(latencies, 95) * 1000:.3f}ms, "
+                    f"p99 {percentile(latencies, 99) * 1000:.3f}ms"
+                )
+        finally:
+            for server in servers:
+                server.terminate()
+
+    print(f"p50 latency, unix vs tcp: {results['tcp'] / results['unix']:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
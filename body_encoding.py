@@ -0,0 +1,163 @@
+import io
+import os
+import zlib
+import json_codec
+
+CONTENT_ENCODINGS = ("gzip", "zstd")
+GZIP_ENCODINGS = ("gzip", "x-gzip")
+DEFAULT_COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+
+def compression_settings(prefix: str):
+    """
+    Read the request body compression of an upstream from its environment variables.
+
+    `{PREFIX}_COMPRESSION` is gzip or zstd (unset for no compression), and bodies
+    smaller than `{PREFIX}_COMPRESSION_MIN_SIZE` bytes are sent uncompressed.
+
+    Returns:
+        dict: compression (str or None) and min_size (int).
+    """
+    return {
+        "compression": os.getenv(f"{prefix}_COMPRESSION") or None,
+        "min_size": int(
+            os.getenv(f"{prefix}_COMPRESSION_MIN_SIZE", DEFAULT_COMPRESSION_MIN_SIZE)
+        ),
+    }
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as err:
+        raise RuntimeError("zstd compression requires the zstandard package") from err
+    return zstandard
+
+
+def check_compression(compression: str):
+    """
+    Check that a request body compression can be used.
+
+    Raises:
+        ValueError: If the compression is not gzip or zstd.
+        RuntimeError: For zstd when the zstandard package is not installed.
+    """
+    if compression is None:
+        return
+    if compression not in CONTENT_ENCODINGS:
+        raise ValueError(
+            f"Unsupported compression {compression!r}, expected gzip or zstd"
+        )
+    if compression == "zstd":
+        _zstandard()
+
+
+def encode_json_body(
+    payload, compression: str = None, min_size: int = DEFAULT_COMPRESSION_MIN_SIZE
+):
+    """
+    Serialize a JSON request body, compressing it if it is large enough.
+
+    Args:
+        payload (dict, list or bytes): The JSON payload, or a payload already
+        serialized with `json_codec.dumps`, which is sent as is.
+        compression (str, optional): gzip or zstd. None sends the body as is.
+        min_size (int): Bodies smaller than this many bytes are not compressed.
+
+    Returns:
+        tuple: (body bytes, dict of the Content-Type and Content-Encoding headers)
+
+    Raises:
+        ValueError: If the compression is not gzip or zstd.
+        RuntimeError: For zstd when the zstandard package is not installed.
+    """
+    check_compression(compression)
+    body = payload if isinstance(payload, bytes) else json_codec.dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    if compression is None or len(body) < min_size:
+        return body, headers
+
+    if compression == "gzip":
+        import gzip
+
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    elif compression == "zstd":
+        body = _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    headers["Content-Encoding"] = compression
+    return body, headers
+
+
+def decode_body(body: bytes, encoding: str):
+    """
+    Decompress a request body sent with a Content-Encoding.
+
+    Args:
+        body (bytes): The compressed body.
+        encoding (str): The Content-Encoding header, gzip or zstd.
+
+    Returns:
+        bytes: The decompressed body.
+
+    Raises:
+        ValueError: If the encoding is not supported, the body is corrupt or it
+        decompresses to more than MAX_DECOMPRESSED_SIZE.
+        RuntimeError: For zstd bodies when the zstandard package is not installed.
+    """
+    if encoding in GZIP_ENCODINGS:
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        try:
+            data = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE + 1)
+        except zlib.error as err:
+            raise ValueError(f"Invalid gzip body: {err}") from err
+        if not decompressor.eof and len(data) <= MAX_DECOMPRESSED_SIZE:
+            raise ValueError("Invalid gzip body: truncated stream")
+    elif encoding == "zstd":
+        zstandard = _zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+        try:
+            data = reader.read(MAX_DECOMPRESSED_SIZE + 1)
+        except zstandard.ZstdError as err:
+            raise ValueError(f"Invalid zstd body: {err}") from err
+    else:
+        raise ValueError(f"Unsupported Content-Encoding {encoding!r}")
+
+    if len(data) > MAX_DECOMPRESSED_SIZE:
+        raise ValueError(f"Decompressed body exceeds {MAX_DECOMPRESSED_SIZE} bytes")
+    return data
+
+
+class DecompressRequestMiddleware:
+    """
+    WSGI middleware decompressing gzip and zstd request bodies before the app reads them.
+
+    Requests with an unsupported or corrupt Content-Encoding are answered with 415
+    or 400 without reaching the app.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding and encoding != "identity":
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            body = environ["wsgi.input"].read(length) if length else b""
+            try:
+                body = decode_body(body, encoding)
+            except (ValueError, RuntimeError) as err:
+                supported = encoding in GZIP_ENCODINGS or (
+                    encoding == "zstd" and isinstance(err, ValueError)
+                )
+                status = (
+                    "400 Bad Request" if supported else "415 Unsupported Media Type"
+                )
+                message = json_codec.dumps({"status": "failure", "message": str(err)})
+                start_response(status, [("Content-Type", "application/json")])
+                return [message]
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
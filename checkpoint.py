@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    Resume point of an ingestion run, persisted to a JSON file.
+
+    Records are registered in file order together with the byte offset right after
+    them. Sends may complete out of order, so the checkpoint only advances over the
+    contiguous prefix of records that were acknowledged, and never past a record
+    still in flight. It stops at the first record that failed, so that the next run
+    sends it again, unless failures are settled because they are recorded elsewhere
+    (e.g. in a dead-letter file). Records may be read on another thread than the
+    one completing them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        input_path: str,
+        interval: float = 5.0,
+        settle_failures: bool = False,
+    ):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.interval = interval
+        self.settle_failures = settle_failures
+        self.offset = 0
+        self.last_id = None
+        self.records = 0
+        self.next_sequence = 0
+        self.settled_sequence = 0
+        self.pending = {}
+        self.settled = {}
+        self.failed_sequence = None
+        self.saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the state saved by a previous run, if any.
+
+        Raises:
+            ValueError: If the checkpoint was written for another input file.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(file=self.path, mode="r", encoding="utf8") as checkpoint_file:
+            state = json.load(checkpoint_file)
+        if state["file"] != self.input_path:
+            raise ValueError(
+                f"Checkpoint {self.path} belongs to {state['file']}, not {self.input_path}"
+            )
+        self.offset = state["offset"]
+        self.last_id = state["last_id"]
+        self.records = state["records"]
+        logger.info(
+            f"Resuming from byte offset {self.offset} after record ID {self.last_id} "
+            f"({self.records} records already acknowledged)"
+        )
+
+    def track(self, records_with_offsets, skip=None):
+        """
+        Register records in file order as they are read.
+
+        Args:
+            records_with_offsets (iterable of tuple): (end offset, record) pairs.
+            skip (callable, optional): Returns True for records not to send, e.g.
+            those already ingested. They are settled right away, so that the
+            checkpoint moves past them, without counting as acknowledged.
+
+        Yields:
+            dict: The records to send, unchanged.
+        """
+        for offset, record in records_with_offsets:
+            skipped = skip is not None and skip(record)
+            with self._lock:
+                sequence = self.next_sequence
+                self.next_sequence += 1
+                if skipped:
+                    self._settle(sequence, offset, record["id"], acknowledged=False)
+                    self._advance()
+                    continue
+                self.pending[id(record)] = (sequence, offset, record["id"])
+            yield record
+
+    def on_complete(self, records, outcomes):
+        """
+        Mark records whose send has completed and save the checkpoint periodically.
+
+        Args:
+            records (list of dict): The records sent.
+            outcomes (list of bool): Whether each record was successfully processed.
+            Failed records are only settled with `settle_failures`.
+        """
+        with self._lock:
+            for record, success in zip(records, outcomes):
+                sequence, offset, record_id = self.pending.pop(id(record))
+                if success or self.settle_failures:
+                    self._settle(sequence, offset, record_id, acknowledged=True)
+                elif self.failed_sequence is None or sequence < self.failed_sequence:
+                    # The checkpoint can no longer move past this record in this run
+                    self.failed_sequence = sequence
+                    self.settled = {
+                        settled: value
+                        for settled, value in self.settled.items()
+                        if settled < sequence
+                    }
+            self._advance()
+
+        if time.monotonic() - self.saved_at >= self.interval:
+            self.save()
+
+    def _settle(self, sequence: int, offset: int, record_id, acknowledged: bool):
+        if self.failed_sequence is None or sequence < self.failed_sequence:
+            self.settled[sequence] = (offset, record_id, acknowledged)
+
+    def _advance(self):
+        while self.settled_sequence in self.settled:
+            self.offset, self.last_id, acknowledged = self.settled.pop(
+                self.settled_sequence
+            )
+            self.settled_sequence += 1
+            self.records += acknowledged
+
+    def save(self):
+        """
+        Atomically replace the checkpoint file and flush it to disk.
+        """
+        with self._lock:
+            state = {
+                "file": self.input_path,
+                "offset": self.offset,
+                "last_id": self.last_id,
+                "records": self.records,
+            }
+        temporary_path = f"{self.path}.tmp"
+        with open(file=temporary_path, mode="w", encoding="utf8") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.saved_at = time.monotonic()
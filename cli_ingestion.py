@@ -1,159 +1,2115 @@
-import time
 import csv
 import argparse
+import glob
+import io
 import os
 import logging
+import mmap
 import re
-import requests
-from dotenv import load_dotenv
+import sys
+import time
+from itertools import count, islice
+from operator import attrgetter, itemgetter
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
+# asyncio, multiprocessing, concurrent.futures, requests, aiohttp, dotenv and
+# http_pool are imported where they are used, so that --help and --dry-run start
+# without loading the HTTP stack. See benchmarks/bench_startup.py.
+from rate_limiter import TokenBucket
+from retry_policy import (
+    DEFAULT_BACKOFF,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_RETRIES,
+    RetryPolicy,
+    is_retryable,
+)
+from record_filter import compile_filter
+from record_type import record_type
+from checkpoint import Checkpoint
+from seen_ids import SeenIds
+from dead_letter import DeadLetterFile, read_dead_letters
+from body_encoding import check_compression, compression_settings, encode_json_body
+import json_codec
+from ingestion_stats import DEFAULT_PROGRESS_INTERVAL, IngestionStats
+from log_events import (
+    DEFAULT_REPORT_INTERVAL,
+    LOG_LEVELS,
+    EventCounters,
+    configure_logging,
+    parse_sample_rates,
+)
+from compressed_input import (
+    COMPRESSION_SUFFIXES,
+    STDIN_PATH,
+    detect_compression,
+    open_input,
 )
+
+configure_logging()
 logger = logging.getLogger(__name__)
+EVENTS = EventCounters()
+STATS = IngestionStats()
+
+VALID_CATEGORIES = frozenset(
+    [
+        "contentinjection",
+        "drivebycompromise",
+        "exploitpublicfacingapplication",
+        "externalremoteservices",
+        "hardwareadditions",
+        "phishing",
+        "replicationthroughremovablemedia",
+        "supplychaincompromise",
+        "trustedrelationship",
+        "validaccounts",
+    ]
+)
+DROPPED_COLUMNS = ("created_utc", "source")
+RENAMED_COLUMNS = {"asset_name": "asset"}
+KEPT_COLUMNS = ("id", "category")
+NON_LETTERS = re.compile("[^A-Za-z]")
+CATEGORY_CACHE_SIZE = 4096
+MMAP_BLOCK_SIZE = 1 << 16
+MAPPED_LINE_MESSAGES = {
+    "invalid_category": "Skipping invalid category in line: %s",
+    "filtered": "Line filtered out: %s",
+    "passed": "Line passed filter: %s",
+}
+DECOMPRESS_SKIP_SIZE = 1 << 20
+SHARDS_PER_WORKER = 4
+SHARD_MAX_SIZE = 16 << 20
+SHARDS_IN_FLIGHT_PER_WORKER = 2
+INPUT_SUFFIXES = (".csv",) + tuple(f".csv{suffix}" for suffix in COMPRESSION_SUFFIXES)
+
+
+def add_sending_arguments(parser):
+    """
+    Add the options shared by ingestion and replay: how records are sent, tracked
+    and reported.
+    """
+    parser.add_argument(
+        "--file-workers",
+        type=int,
+        default=1,
+        help="Number of files ingested at the same time",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Maximum number of requests in flight to the microservice",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "asyncio"],
+        default="threads",
+        help="Send records from a thread pool or from a single-threaded asyncio loop",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Maximum number of records sent per second, unlimited by default",
+    )
+    parser.add_argument(
+        "--burst",
+        type=float,
+        default=None,
+        help="Number of records that may be sent at once after an idle period "
+        "(defaults to one second worth of --rate)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of records sent to the microservice per request",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help="Number of times a record failing with a timeout, a connection error, "
+        "a 408, 429 or 5xx response is sent again. Other 4xx are not retried",
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=DEFAULT_BACKOFF,
+        help="Base delay in seconds of the exponential backoff between retries, "
+        "with full jitter",
+    )
+    parser.add_argument(
+        "--retry-max-backoff",
+        type=float,
+        default=DEFAULT_MAX_BACKOFF,
+        help="Maximum delay in seconds between two attempts",
+    )
+    parser.add_argument(
+        "--retry-deadline",
+        type=float,
+        default=None,
+        help="Seconds after the first attempt past which a record is no longer retried",
+    )
+    parser.add_argument(
+        "--seen-ids",
+        metavar="PATH",
+        default=None,
+        help="Bitmap file of the record ids already ingested. Records whose id is "
+        "in it are skipped, and successfully processed ids are added to it",
+    )
+    parser.add_argument(
+        "--dead-letter",
+        metavar="PATH",
+        default=None,
+        help="Append the records that could not be processed to PATH as NDJSON, "
+        "with their error and number of attempts, to be sent again with replay",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=DEFAULT_PROGRESS_INTERVAL,
+        help="Seconds between progress reports (throughput, requests in flight, "
+        "latency percentiles and errors by type), 0 to disable",
+    )
+    parser.add_argument(
+        "--summary",
+        metavar="PATH",
+        default=None,
+        help="Write the final throughput, latency and error statistics to PATH as JSON",
+    )
+    parser.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=LOG_LEVELS,
+        default=None,
+        help="Logging level, defaults to the LOG_LEVEL environment variable or INFO",
+    )
+    parser.add_argument(
+        "--log-sample",
+        nargs="+",
+        metavar="EVENT=N",
+        default=None,
+        help="Log one in N events of a type (invalid_category, filtered, passed, "
+        "succeeded, failed, retry, http_error, timeout, connection, request_error, "
+        "invalid_response); 0 logs none. Every event is counted regardless",
+    )
+    parser.add_argument(
+        "--log-interval",
+        type=float,
+        default=DEFAULT_REPORT_INTERVAL,
+        help="Seconds between logs of the event counters",
+    )
+
+
+def check_sending_arguments(parser, args):
+    """
+    Validate the options added by `add_sending_arguments`, exiting on error.
+    """
+    try:
+        args.log_sample = parse_sample_rates(args.log_sample)
+    except ValueError as err:
+        parser.error(str(err))
+    if args.file_workers < 1:
+        parser.error("--file-workers must be at least 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.retries < 0:
+        parser.error("--retries must be at least 0")
+    if args.retry_backoff < 0 or args.retry_max_backoff < 0:
+        parser.error("--retry-backoff and --retry-max-backoff must be at least 0")
+    if args.retry_deadline is not None and args.retry_deadline <= 0:
+        parser.error("--retry-deadline must be greater than 0")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.rate is not None and args.rate <= 0:
+        parser.error("--rate must be greater than 0")
+    if args.burst is not None and args.burst < 1:
+        parser.error("--burst must be at least 1")
+    if args.dead_letter and os.path.abspath(args.dead_letter) in map(
+        os.path.abspath, args.input_files
+    ):
+        parser.error("--dead-letter must not be one of the input files")
 
 
-def parse_arguments():
+def parse_arguments(argv: list = None):
     """
     Parse the command line arguments for the CLI
 
+    Args:
+        argv (list of str, optional): The arguments, defaults to sys.argv[1:]. When
+        the first one is `replay`, the arguments of `parse_replay_arguments` are parsed.
+
     Returns:
         argparse.Namespace: Parsed arguments containing the CSV file path and optional filters.
 
     """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "replay":
+        return parse_replay_arguments(argv[1:])
+
     parser = argparse.ArgumentParser(
-        description="CLI to ingest a CSV file for processing."
+        description="CLI to ingest CSV files for processing.",
+        epilog="Run `%(prog)s replay --help` to send the records of dead-letter "
+        "files again.",
     )
     parser.add_argument(
-        "csv_to_ingest", type=str, help="Path to the CSV file to ingest"
+        "csv_to_ingest",
+        type=str,
+        nargs="+",
+        help="Paths, glob patterns or directories of the CSV files to ingest, "
+        "or - to stream records from standard input",
     )
     parser.add_argument(
         "--filter",
         nargs="+",
-        help="Filter records to be ingested based on values",
+        help="Filter records to be ingested based on values. A record is ingested if "
+        "any filter matches: a bare value matches any column, column=value, "
+        "column!=value, column>n (also >=, <, <=) and column~regex match one column",
+        default=None,
+    )
+    parser.add_argument(
+        "--columns",
+        nargs="+",
+        metavar="COLUMN",
+        default=None,
+        help="Only send these columns, named as sent (e.g. asset for asset_name). "
+        "id and category are always kept",
+    )
+    parser.add_argument(
+        "--exclude-columns",
+        nargs="+",
+        metavar="COLUMN",
+        default=None,
+        help="Do not send these columns, named as sent. id and category cannot be "
+        "excluded",
+    )
+    parser.add_argument(
+        "--reader",
+        choices=["csv", "mmap"],
+        default="csv",
+        help="Parse the file with the csv module, or split records straight from a "
+        "memory map and decode only the lines that are kept. The mmap reader "
+        "requires one record per line (no newlines inside quoted fields)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes parsing the CSV file in parallel. "
+        "Requires one record per line (no newlines inside quoted fields)",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="With --workers, send records as soon as any worker has parsed them "
+        "instead of in file order",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
         default=None,
+        help="Save the byte offset of the last acknowledged record to PATH and "
+        "resume from it on restart",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between checkpoint saves",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Parse, normalize and filter the files without sending anything, and "
+        "report throughput, peak memory, time per stage and row counts",
+    )
+    add_sending_arguments(parser)
+    args = parser.parse_args(argv)
+    args.command = "ingest"
+    args.input_files = expand_input_paths(args.csv_to_ingest)
+    if not args.input_files:
+        parser.error("No CSV files found to ingest")
+    check_sending_arguments(parser, args)
+    if args.exclude_columns and set(args.exclude_columns) & set(KEPT_COLUMNS):
+        parser.error("--exclude-columns cannot exclude id or category")
+    if args.filter is not None:
+        try:
+            filter_columns = compile_filter(args.filter).columns or ()
+        except ValueError as err:
+            parser.error(str(err))
+        dropped = [
+            column
+            for column in filter_columns
+            if not column_is_kept(column, args.columns, args.exclude_columns)
+        ]
+        if dropped:
+            parser.error(
+                f"--filter reads columns that are not sent: {', '.join(sorted(dropped))}"
+            )
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and args.reader == "mmap":
+        parser.error("--reader mmap cannot be combined with --workers")
+    if args.checkpoint and (args.workers > 1 or args.reader == "mmap"):
+        parser.error("--checkpoint requires the csv reader without --workers")
+    if args.checkpoint and len(args.input_files) > 1:
+        parser.error("--checkpoint requires a single input file")
+    if args.dry_run and (args.workers > 1 or args.reader == "mmap"):
+        parser.error("--dry-run profiles the csv reader without --workers")
+    if STDIN_PATH in args.input_files and (
+        args.checkpoint or args.workers > 1 or args.reader == "mmap"
+    ):
+        parser.error(
+            "Standard input cannot be read with --checkpoint, --workers or --reader mmap"
+        )
+    if (args.workers > 1 or args.reader == "mmap") and any(
+        detect_compression(file_path) for file_path in args.input_files
+    ):
+        parser.error("--workers and --reader mmap require uncompressed files")
+    return args
+
+
+def parse_replay_arguments(argv: list):
+    """
+    Parse the command line arguments of `replay`, which sends the records of
+    dead-letter files again.
+
+    Returns:
+        argparse.Namespace: Parsed arguments, with the CSV reader options set to
+        their defaults.
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} replay",
+        description="Send the records of dead-letter files to the microservice again.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "dead_letter_files",
+        type=str,
+        nargs="+",
+        help="Dead-letter files written with --dead-letter, or - for standard input",
+    )
+    add_sending_arguments(parser)
+    args = parser.parse_args(argv)
+    args.command = "replay"
+    args.input_files = list(dict.fromkeys(args.dead_letter_files))
+    check_sending_arguments(parser, args)
+    # The records are read as they were sent, without the CSV readers
+    args.filter = None
+    args.columns = None
+    args.exclude_columns = None
+    args.reader = "csv"
+    args.workers = 1
+    args.unordered = False
+    args.checkpoint = None
+    args.dry_run = False
+    return args
+
+
+def expand_input_paths(paths: list):
+    """
+    Resolve the input paths given on the command line into a list of files.
+
+    Args:
+        paths (list of str): File paths, glob patterns or directories. Directories
+        contribute the CSV files they directly contain (plain or compressed).
+
+    Returns:
+        list of str: The files to ingest, without duplicates, sorted within each
+        glob pattern or directory.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                sorted(
+                    entry.path
+                    for entry in os.scandir(path)
+                    if entry.is_file() and entry.name.lower().endswith(INPUT_SUFFIXES)
+                )
+            )
+        elif glob.has_magic(path):
+            files.extend(
+                sorted(match for match in glob.glob(path) if os.path.isfile(match))
+            )
+        else:
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+
+def clean_category(category: str):
+    """
+    Strip everything but letters from a category and lowercase it.
+    """
+    return NON_LETTERS.sub("", category).lower()
 
 
-def check_filter_values(row: dict, filter_values: list):
+def normalize_row(row: dict):
     """
-    Checks if filter values are in the row values
+    Drop, rename and cast the columns of a single CSV row in place.
+
+    This is the row-by-row reference of `compile_row_transform`, used for rows whose
+    number of fields does not match the header.
 
     Args:
         row (dict): The current row of the csv file.
-        filter_values (list of str): List of filter values to match against the CSV rows
 
     Returns:
-        bool: True if filter value is in row otherwise False
+        dict: The normalized row.
+    """
+    for column in DROPPED_COLUMNS:
+        if column in row:
+            del row[column]
+    for column, new_name in RENAMED_COLUMNS.items():
+        if column in row:
+            row[new_name] = row.pop(column)
+    if "id" in row:
+        row["id"] = int(row.pop("id"))
+
+    if "category" in row and isinstance(row["category"], str):
+        row["category"] = clean_category(row["category"])
+    return row
+
+
+def column_is_kept(column: str, columns: list = None, exclude_columns: list = None):
+    """
+    Tell whether a column of the normalized rows is sent, given the column selection.
+
+    Args:
+        column (str): The column name, as sent (after renames).
+        columns (list of str, optional): The only columns to send, besides id and
+        category. All columns if None.
+        exclude_columns (list of str, optional): Columns not to send.
+
+    Returns:
+        bool: True if the column is sent.
+    """
+    if column in KEPT_COLUMNS:
+        return True
+    if columns is not None and column not in columns:
+        return False
+    return exclude_columns is None or column not in exclude_columns
+
+
+def row_layout(fieldnames: list, columns: list = None, exclude_columns: list = None):
+    """
+    Resolve the column operations of `normalize_row` and the column selection
+    against a CSV header.
+
+    Args:
+        fieldnames (list of str): The column names from the CSV header.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
+
+    Returns:
+        dict: The output keys of a normalized row, in order, mapped to the index
+        of the field each one is read from.
+
+    Raises:
+        ValueError: If the header has no category column.
+    """
+    layout = {name: index for index, name in enumerate(fieldnames)}
+    for column in DROPPED_COLUMNS:
+        layout.pop(column, None)
+    for column, new_name in RENAMED_COLUMNS.items():
+        if column in layout:
+            layout[new_name] = layout.pop(column)
+    if "id" in layout:
+        layout["id"] = layout.pop("id")
+    if "category" not in layout:
+        raise ValueError("The CSV header has no category column")
+    if columns is not None:
+        missing = [column for column in columns if column not in layout]
+        if missing:
+            logger.warning(f"Selected columns not in the CSV header: {missing}")
+    return {
+        key: index
+        for key, index in layout.items()
+        if column_is_kept(key, columns, exclude_columns)
+    }
+
+
+def compile_row_transform(
+    fieldnames: list, columns: list = None, exclude_columns: list = None
+):
+    """
+    Build the normalization of a CSV file's rows once from its header.
+
+    Column drops, renames, the column selection and the position of each output key
+    are resolved against the header, so each row only picks its selected fields by
+    index, casts the id and looks its category up in a cache of cleaned categories.
+    Rows are built as the compact record type of the header's keys (see
+    `record_type`), or as dicts when a key cannot be an attribute name or a row has
+    more fields than the header.
+
+    Args:
+        fieldnames (list of str): The column names from the CSV header.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
+
+    Returns:
+        callable: Takes the list of field values of a row and returns the normalized
+        row as a record, or None if its category is invalid. Its `keys` attribute
+        is the tuple of the keys of the records.
+    """
+    layout = row_layout(fieldnames, columns, exclude_columns)
+    projected = columns is not None or exclude_columns is not None
+    width = len(fieldnames)
+    keys = tuple(layout)
+    record_class = record_type(keys)
+    indexes = tuple(layout.values())
+    pick = itemgetter(*indexes)
+    if len(indexes) == 1:
+
+        def pick(values):
+            return (values[indexes[0]],)
+
+    category_index = layout["category"]
+    has_id = "id" in layout
+    cleaned_categories = {}
+
+    def transform(values):
+        if len(values) != width:
+            row = dict(zip(fieldnames, values))
+            if len(values) > width:
+                row[None] = values[width:]
+            else:
+                row.update((name, None) for name in fieldnames[len(values) :])
+            row = normalize_row(row)
+            if projected:
+                row = {key: row[key] for key in keys if key in row}
+            if record_class is not None and None not in row:
+                row = record_class(*(row[key] for key in keys))
+            category = row["category"]
+        else:
+            raw_category = values[category_index]
+            category = cleaned_categories.get(raw_category)
+            if category is None:
+                category = clean_category(raw_category)
+                if len(cleaned_categories) < CATEGORY_CACHE_SIZE:
+                    cleaned_categories[raw_category] = category
+            row = None
+
+        if category not in VALID_CATEGORIES:
+            return None
+
+        if row is None:
+            if record_class is None:
+                row = dict(zip(keys, pick(values)))
+                row["category"] = category
+                if has_id:
+                    row["id"] = int(row["id"])
+            else:
+                row = record_class(*pick(values))
+                row.category = category
+                if has_id:
+                    row.id = int(row.id)
+        return row
+
+    transform.keys = keys
+    return transform
+
+
+def filter_rows(
+    rows, transform, filter_values: list = None, events: EventCounters = None
+):
+    """
+    Normalize CSV rows and drop those with an invalid category or not matching the filters.
+
+    Args:
+        rows (iterable of list): Field values of each row, as produced by csv.reader.
+        transform (callable): The row normalization built by `compile_row_transform`.
+        filter_values (list of str, optional): List of filter expressions to match against
+        the CSV rows, see `record_filter.compile_filter`. If None, no filtering is applied.
+        events (EventCounters, optional): Counters of the rows skipped, filtered out
+        and passed. Defaults to the process-wide EVENTS.
+
+    Yields:
+        dict: A normalized row where any filter value is matched.
     """
-    for filter_value in filter_values:
-        if filter_value in row.values():
-            return True
-    return False
+    events = EVENTS if events is None else events
+    matches = None if filter_values is None else compile_filter(filter_values)
+    for values in rows:
+        if not values:
+            continue  # Blank lines are skipped, as csv.DictReader does
+        row = transform(values)
+        if row is None:
+            if events.record("invalid_category"):
+                logger.debug("Skipping invalid category in row: %s", values)
+            continue
+
+        if matches is None or matches(row):
+            if events.record("passed"):
+                logger.debug("Record passed filter: %s", row["id"])
+            yield row
+        elif events.record("filtered"):
+            logger.debug("Record filtered out: %s", row["id"])
 
 
-def read_csv_file(file_path: str, filter_values: list = None):
+def read_csv_file(
+    file_path: str,
+    filter_values: list = None,
+    columns: list = None,
+    exclude_columns: list = None,
+):
     """
     Read a CSV file and optionally filter records based on provided filter values.
 
+    Files compressed with gzip, bz2, xz or zstd are decompressed while being read.
+    Standard input ("-") is read incrementally, so records are yielded as they arrive.
+
     Args:
-        file_path (str): The path to the CSV file.
+        file_path (str): The path to the CSV file, or "-" for standard input.
         filter_values (list of str, optional): List of filter values to match against the CSV rows.
         If None, no filtering is applied.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
 
     Yields:
-        dict: A dictionary representing a row in the CSV file where any filter value is matched.
+        Record: A row of the CSV file where any filter value is matched, read like a
+        dict (see `record_type`). Rows with more fields than the header are dicts.
     """
+    with io.TextIOWrapper(open_input(file_path), encoding="utf8") as csvfile:
+        reader = csv.reader(csvfile, delimiter=";")
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return
+        transform = compile_row_transform(fieldnames, columns, exclude_columns)
+        yield from filter_rows(reader, transform, filter_values)
 
-    valid_category = [
-        "contentinjection",
-        "drivebycompromise",
-        "exploitpublicfacingapplication",
-        "externalremoteservices",
-        "hardwareadditions",
-        "phishing",
-        "replicationthroughremovablemedia",
-        "supplychaincompromise",
-        "trustedrelationship",
-        "validaccounts",
-    ]
-    with open(file=file_path, mode="r", encoding="utf8") as csvfile:
-        reader = csv.DictReader(f=csvfile, delimiter=";")
-        for row in reader:
-            if "created_utc" in row:
-                del row["created_utc"]
-            if "source" in row:
-                del row["source"]
-            if "asset_name" in row:
-                row["asset"] = row.pop("asset_name")
-            if "id" in row:
-                row["id"] = int(row.pop("id"))
-
-            if "category" in row and isinstance(row["category"], str):
-                row["category"] = re.sub("[^A-Za-z]", "", row["category"]).lower()
-
-            if row["category"] not in valid_category:
-                logger.debug(f"Skipping invalid category: {row['category']}")
-                continue
-
-            if filter_values is None or check_filter_values(
-                row=row, filter_values=filter_values
-            ):
-                logger.debug(f"Record passed filter: {row['id']}")
-                yield row
-            else:
-                logger.debug(f"Record filtered out: {row['id']}")
 
+class CountingReader(io.RawIOBase):
+    """
+    Raw stream counting the bytes read from another binary stream.
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.stream.readinto(buffer)
+        self.bytes_read += size
+        return size
 
-def send_request_to_microservice(record):
+    def close(self):
+        if not self.closed:
+            self.stream.close()
+        super().close()
+
+
+def profile_csv_file(
+    file_path: str,
+    filter_values: list = None,
+    columns: list = None,
+    exclude_columns: list = None,
+):
     """
-    Send a single record to the Microservice API for processing.
+    Run the read_csv_file pipeline over a file without sending anything, timing each stage.
 
     Args:
-        record (dict): The dictionary containing the CSV row data to be sent to the microservice.
+        file_path (str): The path to the CSV file, or "-" for standard input.
+        filter_values (list of str, optional): List of filter expressions to match against
+        the CSV rows, see `record_filter.compile_filter`. If None, no filtering is applied.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
 
     Returns:
-        bool: True if the record was successfully processed, False otherwise.
+        dict: Row counts (rows, invalid_category, filtered, passed), bytes read
+        (decompressed) and seconds spent in each stage (read_parse, normalize, filter).
     """
-    microservice_path = os.getenv("MICROSERVICE_PATH")
-    headers = {"Content-Type": "application/json", "Accept": "application/json"}
+    stats = dict.fromkeys(
+        ["rows", "invalid_category", "filtered", "passed", "bytes"], 0
+    )
+    stats.update(dict.fromkeys(["read_parse", "normalize", "filter"], 0.0))
+    clock = time.perf_counter
+
+    counter = CountingReader(open_input(file_path))
+    with io.TextIOWrapper(io.BufferedReader(counter), encoding="utf8") as csvfile:
+        reader = csv.reader(csvfile, delimiter=";")
+        fieldnames = next(reader, None)
+        if fieldnames is not None:
+            transform = compile_row_transform(fieldnames, columns, exclude_columns)
+            matches = None if filter_values is None else compile_filter(filter_values)
+            while True:
+                started = clock()
+                values = next(reader, None)
+                parsed = clock()
+                stats["read_parse"] += parsed - started
+                if values is None:
+                    break
+                if not values:
+                    continue
+                stats["rows"] += 1
+                row = transform(values)
+                normalized = clock()
+                stats["normalize"] += normalized - parsed
+                if row is None:
+                    stats["invalid_category"] += 1
+                    continue
+                passed = matches is None or matches(row)
+                stats["filter"] += clock() - normalized
+                stats["passed" if passed else "filtered"] += 1
+        stats["bytes"] = counter.bytes_read
+    return stats
 
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of the process in MB, or None if unavailable.
+    """
     try:
-        response = requests.post(
-            url=microservice_path, json=record, timeout=10, headers=headers
-        )
-        response.raise_for_status()
-        logger.info(f"Successfully processed record ID: {record['id']}")
-        return True
-    except requests.exceptions.HTTPError:
-        logger.error(
-            f"HTTP error while processing record ID {record['id']}: {response.content}"
-        )
-        return False
-    except requests.exceptions.Timeout:
-        logger.error(f"Timeout error for record ID: {record['id']}")
-        return False
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
 
 
-def main():
-    load_dotenv()
+def dry_run(
+    file_paths: list,
+    filter_values: list = None,
+    columns: list = None,
+    exclude_columns: list = None,
+):
+    """
+    Parse, normalize and filter files without sending anything, and log throughput.
+    """
+    totals = {}
+    started = time.perf_counter()
+    for file_path in file_paths:
+        stats = profile_csv_file(file_path, filter_values, columns, exclude_columns)
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    elapsed = max(time.perf_counter() - started, 1e-9)
 
-    args = parse_arguments()
-    success_count = 0
-    total_count = 0
+    logger.info(
+        f"Dry run completed in {elapsed:.2f}s: {totals['rows'] / elapsed:,.0f} rows/s, "
+        f"{totals['bytes'] / elapsed / (1024 * 1024):,.1f} MB/s, "
+        f"peak RSS {peak_rss_mb() or 0:,.1f} MB."
+    )
+    logger.info(
+        f"Rows: {totals['rows']} read, {totals['invalid_category']} invalid category, "
+        f"{totals['filtered']} filtered out, {totals['passed']} passed."
+    )
+    logger.info(
+        f"Stage time: read+parse {totals['read_parse']:.2f}s, "
+        f"normalize {totals['normalize']:.2f}s, filter {totals['filter']:.2f}s."
+    )
 
-    for record in read_csv_file(args.csv_to_ingest, args.filter):
-        total_count += 1
-        success = send_request_to_microservice(record=record)
-        if success:
-            success_count += 1
+
+def read_csv_file_with_offsets(
+    file_path: str,
+    filter_values: list = None,
+    start_offset: int = 0,
+    columns: list = None,
+    exclude_columns: list = None,
+):
+    """
+    Read a CSV file like `read_csv_file`, also returning where each record ends.
+
+    Reading can resume at a byte offset returned by a previous run: the header is
+    read, then the file is seeked straight to that offset without parsing the
+    records before it. Offsets of compressed files count decompressed bytes, and
+    resuming one decompresses and discards the bytes before the offset.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        filter_values (list of str, optional): List of filter expressions to match against
+        the CSV rows, see `record_filter.compile_filter`. If None, no filtering is applied.
+        start_offset (int): Byte offset of the first record to read. Offsets before the
+        end of the header are ignored.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
+
+    Yields:
+        tuple: (byte offset right after the record, record dict)
+    """
+    with open_input(file_path) as csvfile:
+        header = csvfile.readline()
+        if not header:
+            return
+        fieldnames = next(csv.reader([header.decode("utf8")], delimiter=";"))
+        end_offset = max(start_offset, len(header))
+        if csvfile.seekable():
+            csvfile.seek(end_offset)
         else:
-            logger.error(f"Failed to process record ID: {record['id']}")
-        time.sleep(0.5)  # To prevent overwhelming the service
+            skip = end_offset - len(header)
+            while skip > 0:
+                skipped = len(csvfile.read(min(skip, DECOMPRESS_SKIP_SIZE)))
+                if not skipped:
+                    break
+                skip -= skipped
+
+        def lines():
+            nonlocal end_offset
+            for line in csvfile:
+                end_offset += len(line)
+                yield line.decode("utf8")
+
+        # csv.reader pulls lines only until a record is complete, so once a record
+        # comes out of filter_rows, end_offset is right after its last line
+        reader = csv.reader(lines(), delimiter=";")
+        transform = compile_row_transform(fieldnames, columns, exclude_columns)
+        for row in filter_rows(reader, transform, filter_values):
+            yield end_offset, row
+
+
+def read_csv_file_mmap(
+    file_path: str,
+    filter_values: list = None,
+    columns: list = None,
+    exclude_columns: list = None,
+):
+    """
+    Read a CSV file from a memory map, decoding only the lines that are kept.
+
+    The map is split into lines one large block at a time, and the pages of each
+    block are released once it is copied out, so resident memory stays around one
+    block however large the file. The raw category field of each line is checked
+    first, so lines with an invalid category are never decoded. When the filters
+    only read the category, their outcome is cached per category too, and filtered
+    out lines are not decoded either. Lines containing quotes, or with a number of
+    fields not matching the header, go through the csv module instead. Records are
+    assumed to be one per line, i.e. quoted fields must not contain newlines.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        filter_values (list of str, optional): List of filter expressions to match against
+        the CSV rows, see `record_filter.compile_filter`. If None, no filtering is applied.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
+
+    Yields:
+        dict: The same records as `read_csv_file`.
+    """
+    with open(file=file_path, mode="rb") as csvfile:
+        if os.fstat(csvfile.fileno()).st_size == 0:
+            return
+        with mmap.mmap(csvfile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            yield from filter_mapped_lines(
+                mapped, filter_values, columns, exclude_columns
+            )
+
+
+def category_event(category: str, matches=None):
+    """
+    Tell what happens to the lines of a raw category, see `filter_mapped_lines`.
+
+    Args:
+        category (str): The raw category field.
+        matches (callable, optional): A filter reading only the category.
+
+    Returns:
+        str: The event of the lines: invalid_category, filtered, or passed when
+        they are kept (and still go through any other filter).
+    """
+    category = clean_category(category)
+    if category not in VALID_CATEGORIES:
+        return "invalid_category"
+    if matches is not None and not matches({"category": category}):
+        return "filtered"
+    return "passed"
+
+
+def filter_mapped_lines(
+    mapped,
+    filter_values: list = None,
+    columns: list = None,
+    exclude_columns: list = None,
+):
+    """
+    Normalize and filter the lines of a memory-mapped CSV file, see `read_csv_file_mmap`.
+    """
+    size = len(mapped)
+    header_end = mapped.find(b"\n")
+    if header_end == -1:
+        header_end = size
+    header = mapped[:header_end].rstrip(b"\r").decode("utf8")
+    fieldnames = next(csv.reader([header], delimiter=";"))
+
+    transform = compile_row_transform(fieldnames, columns, exclude_columns)
+    matches = None if filter_values is None else compile_filter(filter_values)
+    width = len(fieldnames)
+    category_index = row_layout(fieldnames)["category"]
+    # Filters reading only the category keep or drop all the lines of a category
+    category_matches = None
+    row_matches = matches
+    if matches is not None and matches.columns == {"category"}:
+        category_matches, row_matches = matches, None
+    # Raw category field -> event of its lines, see category_event
+    events = {}
+    # Sampled debug logs need each event counted as it happens
+    sampled = logger.isEnabledFor(logging.DEBUG)
+
+    for block in mapped_blocks(mapped, header_end + 1):
+        lines = block.split(b"\n")
+        if block.endswith(b"\n"):
+            lines.pop()
+        if b"\r" in block:
+            lines = [line[:-1] if line.endswith(b"\r") else line for line in lines]
+        quoted = b'"' in block
+        counts = dict.fromkeys(MAPPED_LINE_MESSAGES, 0)
+        try:
+            for line in lines:
+                if not line:
+                    continue  # Blank lines are skipped, as csv.DictReader does
+                fields = None if quoted and b'"' in line else line.split(b";")
+                if fields is not None and len(fields) == width:
+                    raw_category = fields[category_index]
+                    event = events.get(raw_category)
+                    if event is None:
+                        event = category_event(
+                            raw_category.decode("utf8"), category_matches
+                        )
+                        if len(events) < CATEGORY_CACHE_SIZE:
+                            events[raw_category] = event
+                    if event == "passed":
+                        row = transform(line.decode("utf8").split(";"))
+                        if row_matches is not None and not row_matches(row):
+                            event = "filtered"
+                else:
+                    # Quoted or malformed line: parse it the same way as read_csv_file
+                    values = next(csv.reader([line.decode("utf8")], delimiter=";"))
+                    row = transform(values)
+                    if row is None:
+                        event = "invalid_category"
+                    elif matches is None or matches(row):
+                        event = "passed"
+                    else:
+                        event = "filtered"
 
+                if not sampled:
+                    counts[event] += 1
+                elif EVENTS.record(event):
+                    logger.debug(MAPPED_LINE_MESSAGES[event], line)
+                if event == "passed":
+                    yield row
+        finally:
+            for event, total in counts.items():
+                if total:
+                    EVENTS.record(event, total)
+
+
+def mapped_blocks(mapped, start: int):
+    """
+    Split a memory-mapped file into large blocks of whole lines from `start`.
+
+    The pages of each block are released once it is copied out of the map, as
+    mapped pages otherwise stay resident until the map is closed.
+
+    Yields:
+        bytes: The next block, ending with a newline unless it ends the file.
+    """
+    size = len(mapped)
+    released = 0
+    while start < size:
+        end = mapped.rfind(b"\n", start, min(size, start + MMAP_BLOCK_SIZE)) + 1
+        if end == 0:
+            end = mapped.find(b"\n", start) + 1 or size
+        block = mapped[start:end]
+        start = end
+        # Ranges passed to madvise must start on a page boundary
+        release_end = end - end % mmap.PAGESIZE
+        if release_end > released and hasattr(mmap, "MADV_DONTNEED"):
+            mapped.madvise(mmap.MADV_DONTNEED, released, release_end - released)
+            released = release_end
+        yield block
+
+
+def csv_byte_ranges(file_path: str, parts: int):
+    """
+    Split a CSV file into byte ranges that start and end on record boundaries.
+
+    Records are assumed to be one per line, i.e. quoted fields must not contain newlines.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        parts (int): The number of ranges to aim for. Fewer are returned for small files.
+
+    Returns:
+        tuple: (list of str fieldnames from the header, list of (start, end) byte offsets)
+    """
+    size = os.path.getsize(file_path)
+    with open(file=file_path, mode="rb") as csvfile:
+        header = csvfile.readline()
+        boundaries = [csvfile.tell()]
+        for part in range(1, parts):
+            csvfile.seek(boundaries[0] + (size - boundaries[0]) * part // parts)
+            csvfile.readline()  # Move to the start of the next record
+            boundary = min(csvfile.tell(), size)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        if size > boundaries[-1]:
+            boundaries.append(size)
+
+    fieldnames = next(csv.reader([header.decode("utf8")], delimiter=";"))
+    return fieldnames, list(zip(boundaries, boundaries[1:]))
+
+
+def read_csv_range(
+    file_path: str,
+    fieldnames: list,
+    start: int,
+    end: int,
+    filter_values: list = None,
+    sample_every: dict = None,
+    columns: list = None,
+    exclude_columns: list = None,
+):
+    """
+    Read, normalize and filter the records of a byte range of a CSV file.
+
+    Runs in a worker process of `read_csv_file_sharded`.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        fieldnames (list of str): The column names from the CSV header.
+        start (int): Byte offset of the first record of the range.
+        end (int): Byte offset right after the last record of the range.
+        filter_values (list of str, optional): List of filter values to match against the CSV rows.
+        sample_every (dict, optional): Log sampling of the worker's event counters.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
+
+    Returns:
+        tuple: (tuple of the keys of the records, list of the records of the range
+        where any filter value is matched, dict of the counts of the range's events).
+        Records are sent to the parent as tuples of their values, in the order of
+        the keys, as they pickle several times faster than records. Rows that are
+        not records (see `compile_row_transform`) are sent as dicts.
+    """
+
+    def lines(csvfile):
+        while csvfile.tell() < end:
+            line = csvfile.readline()
+            if not line:
+                return
+            yield line.decode("utf8")
+
+    with open(file=file_path, mode="rb") as csvfile:
+        csvfile.seek(start)
+        reader = csv.reader(lines(csvfile), delimiter=";")
+        transform = compile_row_transform(fieldnames, columns, exclude_columns)
+        # Counted here and merged by the parent, which reports them
+        events = EventCounters(sample_every)
+        records = list(filter_rows(reader, transform, filter_values, events))
+
+    keys = transform.keys
+    values = attrgetter(*keys)
+    if len(keys) == 1:
+
+        def values(record):
+            return (getattr(record, keys[0]),)
+
+    rows = [row if isinstance(row, dict) else values(row) for row in records]
+    return keys, rows, events.counts
+
+
+def read_csv_file_sharded(
+    file_path: str,
+    filter_values: list = None,
+    workers: int = 2,
+    ordered: bool = True,
+    columns: list = None,
+    exclude_columns: list = None,
+):
+    """
+    Read a CSV file with several processes, each parsing its own byte range of the file.
+
+    The file is cut into more ranges than workers so that the sender is fed as soon
+    as the first ranges are parsed and slow ranges do not stall the other workers.
+    Ranges are at most SHARD_MAX_SIZE bytes, and only SHARDS_IN_FLIGHT_PER_WORKER
+    ranges per worker are parsed or waiting to be sent at a time, so that memory
+    stays bounded when the sender is slower than the workers, whatever the file size.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        filter_values (list of str, optional): List of filter values to match against the CSV rows.
+        workers (int): Number of worker processes.
+        ordered (bool): Yield records in file order. When False, records are yielded
+        in the order their ranges finish parsing.
+        columns (list of str, optional): The only columns to keep, see `column_is_kept`.
+        exclude_columns (list of str, optional): Columns to drop.
+
+    Yields:
+        dict: The same records as `read_csv_file`.
+    """
+    parts = max(
+        workers * SHARDS_PER_WORKER, -(-os.path.getsize(file_path) // SHARD_MAX_SIZE)
+    )
+    fieldnames, ranges = csv_byte_ranges(file_path, parts)
+    tasks = (
+        (
+            file_path,
+            fieldnames,
+            start,
+            end,
+            filter_values,
+            EVENTS.sample_every,
+            columns,
+            exclude_columns,
+        )
+        for start, end in ranges
+    )
+
+    import multiprocessing
+    import queue
+    from collections import deque
+
+    # Pool.imap would parse every range ahead of the sender
+    in_flight = deque()
+    finished = None if ordered else queue.SimpleQueue()
+    callbacks = (
+        {} if ordered else {"callback": finished.put, "error_callback": finished.put}
+    )
+    with multiprocessing.Pool(processes=workers) as pool:
+        while True:
+            while len(in_flight) < workers * SHARDS_IN_FLIGHT_PER_WORKER:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                in_flight.append(
+                    pool.apply_async(_read_csv_range_task, (task,), **callbacks)
+                )
+            if not in_flight:
+                break
+
+            if ordered:
+                keys, rows, counts = in_flight.popleft().get()
+            else:
+                result = finished.get()
+                if isinstance(result, BaseException):
+                    raise result
+                keys, rows, counts = result
+                # Only the number of ranges in flight matters
+                in_flight.popleft()
+            EVENTS.merge(counts)
+            record_class = record_type(keys)
+            for row in rows:
+                yield row if isinstance(row, dict) else record_class(*row)
+
+
+def _read_csv_range_task(task):
+    return read_csv_range(*task)
+
+
+def microservice_request_body(payload):
+    """
+    Serialize a request body to the microservice, compressed as configured by
+    MICROSERVICE_COMPRESSION and MICROSERVICE_COMPRESSION_MIN_SIZE.
+
+    Returns:
+        tuple: (body bytes, dict of request headers)
+    """
+    body, headers = encode_json_body(payload, **compression_settings("MICROSERVICE"))
+    headers["Accept"] = "application/json"
+    return body, headers
+
+
+def batched(records, batch_size: int):
+    """
+    Group records into lists of at most `batch_size` records.
+
+    Args:
+        records (iterable of dict): The records to group.
+        batch_size (int): Maximum number of records per list.
+
+    Yields:
+        list of dict: The next group of records.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def microservice_batch_path():
+    """
+    Return the URL of the Microservice API batch endpoint.
+
+    Defaults to MICROSERVICE_PATH with `/process_record` replaced by `/process_records`.
+
+    Returns:
+        str: MICROSERVICE_BATCH_PATH, or the default. None if it is not set and
+        MICROSERVICE_PATH does not end with `/process_record`.
+    """
+    batch_path = os.getenv("MICROSERVICE_BATCH_PATH")
+    if batch_path:
+        return batch_path
+    microservice_path = os.getenv("MICROSERVICE_PATH", "").rstrip("/")
+    if microservice_path.endswith("/process_record"):
+        return microservice_path + "s"
+    return None
+
+
+def microservice_request(records):
+    """
+    Build the request sending records to the microservice: the single-record endpoint
+    for one record, the batch endpoint otherwise.
+
+    Returns:
+        tuple: (url, body bytes, dict of request headers)
+    """
+    if len(records) == 1:
+        return (os.getenv("MICROSERVICE_PATH"), *microservice_request_body(records[0]))
+    return (microservice_batch_path(), *microservice_request_body(records))
+
+
+def batch_errors(records, results):
+    """
+    Turn the per-record results of a batch response into errors.
+
+    Args:
+        records (list of dict): The records sent in the batch.
+        results (list of dict): The per-record results returned by the batch endpoint,
+        in the same order as `records`.
+
+    Returns:
+        list: For each record, None if it was successfully processed, or its error.
+
+    Raises:
+        ValueError: If there is not one result per record, i.e. the response is invalid.
+    """
+    if len(results) != len(records):
+        raise ValueError(
+            f"{len(results)} results for a batch of {len(records)} records"
+        )
+    errors = []
+    for record, result in zip(records, results):
+        if result["status_code"] < 400:
+            errors.append(None)
+        else:
+            if EVENTS.record("http_error"):
+                logger.error(
+                    "HTTP error while processing record ID %s: %s", record["id"], result
+                )
+            errors.append(f"http_{result['status_code']}")
+    return errors
+
+
+def log_request_error(records, error: str, detail=None):
+    """
+    Log a sample of the requests that failed as a whole.
+    """
+    event = "http_error" if error.startswith("http_") else error
+    if not EVENTS.record(event, len(records)):
+        return
+    if len(records) == 1:
+        logger.error(
+            "Error %s while processing record ID %s: %s",
+            error,
+            records[0]["id"],
+            detail,
+        )
+    else:
+        logger.error(
+            "Error %s while processing batch of %d records: %s",
+            error,
+            len(records),
+            detail,
+        )
+
+
+def post_to_microservice(records, request, limiter: TokenBucket = None):
+    """
+    Make one attempt at sending records to the microservice.
+
+    Args:
+        records (list of dict): The records to send.
+        request (tuple): (url, body, headers) built by `microservice_request`.
+        limiter (TokenBucket, optional): Rate limiter notified of throttling responses.
+
+    Returns:
+        list: For each record, None if it was successfully processed, or the kind of
+        error it failed with (timeout, connection, request_error, invalid_response or
+        http_<status code>).
+    """
+    import requests
+
+    from http_pool import get_session
+
+    url, body, headers = request
+    try:
+        with STATS.request():
+            response = get_session("MICROSERVICE").post(
+                url=url, data=body, headers=headers
+            )
+        if limiter is not None:
+            limiter.observe(response.status_code, response.headers.get("Retry-After"))
+        response.raise_for_status()
+        if len(records) == 1:
+            return [None]
+        return batch_errors(records, json_codec.loads(response.content)["results"])
+    except requests.exceptions.HTTPError:
+        error, detail = f"http_{response.status_code}", response.content
+    except requests.exceptions.Timeout as err:
+        error, detail = "timeout", err
+    except (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+    ) as err:
+        # Including connections dropped while the response was being read
+        error, detail = "connection", err
+    except requests.exceptions.RequestException as err:
+        error, detail = "request_error", err
+    except (ValueError, KeyError, TypeError) as err:
+        error, detail = "invalid_response", err
+    log_request_error(records, error, detail)
+    return [error] * len(records)
+
+
+async def post_to_microservice_async(
+    session, records, request, limiter: TokenBucket = None
+):
+    """
+    Make one attempt at sending records to the microservice from an asyncio event loop.
+
+    Args:
+        session (aiohttp.ClientSession): The session used to send the request.
+        records (list of dict): The records to send.
+        request (tuple): (url, body, headers) built by `microservice_request`.
+        limiter (TokenBucket, optional): Rate limiter notified of throttling responses.
+
+    Returns:
+        list: For each record, None if it was successfully processed, or the kind of
+        error it failed with, as returned by `post_to_microservice`.
+    """
+    import asyncio
+
+    import aiohttp
+
+    from http_pool import UNIX_SCHEME, split_unix_url
+
+    url, body, headers = request
+    if url.startswith(UNIX_SCHEME):
+        # The session's connector already targets the socket
+        url = "http://localhost" + split_unix_url(url)[1]
+    try:
+        with STATS.request():
+            async with session.post(url=url, data=body, headers=headers) as response:
+                if limiter is not None:
+                    limiter.observe(
+                        response.status, response.headers.get("Retry-After")
+                    )
+                content = await response.read()
+        if response.status >= 400:
+            error, detail = f"http_{response.status}", content
+        elif len(records) == 1:
+            return [None]
+        else:
+            return batch_errors(records, json_codec.loads(content)["results"])
+    except asyncio.TimeoutError as err:
+        error, detail = "timeout", err
+    except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as err:
+        error, detail = "connection", err
+    except aiohttp.ClientError as err:
+        error, detail = "request_error", err
+    except (ValueError, KeyError, TypeError) as err:
+        error, detail = "invalid_response", err
+    log_request_error(records, error, detail)
+    return [error] * len(records)
+
+
+def settle_attempt(
+    records,
+    pending: list,
+    errors: list,
+    outcomes: list,
+    attempt: int,
+    can_retry: bool,
+    on_failure=None,
+):
+    """
+    Record the outcome of an attempt and pick the records to retry.
+
+    Args:
+        records (list of dict): All the records of the request.
+        pending (list of int): Indexes of the records sent in the attempt.
+        errors (list): The error of each record sent, None on success.
+        outcomes (list of bool): Success flags of all the records, updated in place.
+        attempt (int): The number of the attempt, from 0.
+        can_retry (bool): Whether the retry policy allows another attempt.
+        on_failure (callable, optional): Called with each record that failed for good,
+        its error and the number of attempts made.
+
+    Returns:
+        list of int: Indexes of the records to send again.
+    """
+    retry = []
+    for index, error in zip(pending, errors):
+        if error is None:
+            outcomes[index] = True
+        elif can_retry and is_retryable(error):
+            retry.append(index)
+        else:
+            STATS.error(error)
+            if on_failure is not None:
+                on_failure(records[index], error, attempt + 1)
+    if retry and EVENTS.record("retry", len(retry)):
+        logger.warning(
+            "Retrying %d records after %s", len(retry), errors[pending.index(retry[0])]
+        )
+    return retry
+
+
+def send_batch_to_microservice(
+    records,
+    limiter: TokenBucket = None,
+    retry_policy: RetryPolicy = None,
+    on_failure=None,
+):
+    """
+    Send a list of records to the Microservice API, retrying those that failed
+    with a retryable error.
+
+    A single record is sent to the single-record endpoint, several records to the
+    batch endpoint in one request. Only the records that failed are sent again, and
+    the request body is reused while they are the same.
+
+    Args:
+        records (list of dict): The records to be sent to the microservice.
+        limiter (TokenBucket, optional): Rate limiter notified of throttling responses,
+        and paced per record retried.
+        retry_policy (RetryPolicy, optional): Retries and backoff. No retries if None.
+        on_failure (callable, optional): Called with each record that could not be
+        processed, its error and the number of attempts made.
+
+    Returns:
+        list of bool: For each record, True if it was successfully processed, False otherwise.
+    """
+    outcomes = [False] * len(records)
+    pending = list(range(len(records)))
+    request = None
+    started = time.monotonic()
+    for attempt in count():
+        batch = [records[index] for index in pending]
+        if request is None:
+            request = microservice_request(batch)
+        errors = post_to_microservice(batch, request, limiter)
+        delay = None if retry_policy is None else retry_policy.delay(attempt, started)
+        retry = settle_attempt(
+            records, pending, errors, outcomes, attempt, delay is not None, on_failure
+        )
+        if not retry:
+            return outcomes
+        if len(retry) != len(pending):
+            request = None
+        pending = retry
+        time.sleep(delay)
+        if limiter is not None:
+            limiter.acquire(len(pending))
+
+
+async def send_batch_to_microservice_async(
+    session,
+    records,
+    limiter: TokenBucket = None,
+    retry_policy: RetryPolicy = None,
+    on_failure=None,
+):
+    """
+    Send a list of records to the Microservice API from an asyncio event loop, like
+    `send_batch_to_microservice`. Backing off does not hold up the other requests.
+
+    Args:
+        session (aiohttp.ClientSession): The session used to send the requests.
+        records (list of dict): The records to be sent to the microservice.
+        limiter (TokenBucket, optional): Rate limiter notified of throttling responses,
+        and paced per record retried.
+        retry_policy (RetryPolicy, optional): Retries and backoff. No retries if None.
+        on_failure (callable, optional): Called with each record that could not be
+        processed, its error and the number of attempts made.
+
+    Returns:
+        list of bool: For each record, True if it was successfully processed, False otherwise.
+    """
+    import asyncio
+
+    outcomes = [False] * len(records)
+    pending = list(range(len(records)))
+    request = None
+    started = time.monotonic()
+    for attempt in count():
+        batch = [records[index] for index in pending]
+        if request is None:
+            request = microservice_request(batch)
+        errors = await post_to_microservice_async(session, batch, request, limiter)
+        delay = None if retry_policy is None else retry_policy.delay(attempt, started)
+        retry = settle_attempt(
+            records, pending, errors, outcomes, attempt, delay is not None, on_failure
+        )
+        if not retry:
+            return outcomes
+        if len(retry) != len(pending):
+            request = None
+        pending = retry
+        await asyncio.sleep(delay)
+        if limiter is not None:
+            await limiter.acquire_async(len(pending))
+
+
+def send_request_to_microservice(
+    record, limiter: TokenBucket = None, retry_policy: RetryPolicy = None
+):
+    """
+    Send a single record to the Microservice API for processing.
+
+    Args:
+        record (dict): The dictionary containing the CSV row data to be sent to the microservice.
+        limiter (TokenBucket, optional): Rate limiter notified of throttling responses.
+        retry_policy (RetryPolicy, optional): Retries and backoff. No retries if None.
+
+    Returns:
+        bool: True if the record was successfully processed, False otherwise.
+    """
+    return send_batch_to_microservice([record], limiter, retry_policy)[0]
+
+
+async def send_request_to_microservice_async(
+    session, record, limiter: TokenBucket = None, retry_policy: RetryPolicy = None
+):
+    """
+    Send a single record to the Microservice API from an asyncio event loop.
+
+    Args:
+        session (aiohttp.ClientSession): The session used to send the request.
+        record (dict): The dictionary containing the CSV row data to be sent to the microservice.
+        limiter (TokenBucket, optional): Rate limiter notified of throttling responses.
+        retry_policy (RetryPolicy, optional): Retries and backoff. No retries if None.
+
+    Returns:
+        bool: True if the record was successfully processed, False otherwise.
+    """
+    outcomes = await send_batch_to_microservice_async(
+        session, [record], limiter, retry_policy
+    )
+    return outcomes[0]
+
+
+def count_outcomes(records, outcomes):
+    """
+    Count the successes and failures of a sent batch, logging a sample of them.
+
+    Args:
+        records (list of dict): The records sent.
+        outcomes (list of bool): Whether each record was successfully processed.
+
+    Returns:
+        int: The number of records successfully processed.
+    """
+    for record, success in zip(records, outcomes):
+        if success:
+            if EVENTS.record("succeeded"):
+                logger.debug("Successfully processed record ID: %s", record["id"])
+        elif EVENTS.record("failed"):
+            logger.error("Failed to process record ID: %s", record["id"])
+    STATS.completed(outcomes)
+    return sum(outcomes)
+
+
+def send_records_sequentially(
+    records,
+    limiter: TokenBucket,
+    batch_size: int = 1,
+    on_complete=None,
+    retry_policy: RetryPolicy = None,
+    on_failure=None,
+):
+    """
+    Send records one request at a time, at the pace allowed by the rate limiter.
+
+    Args:
+        records (iterable of dict): The records to send to the microservice.
+        limiter (TokenBucket): Rate limiter paced per record sent.
+        batch_size (int): Number of records sent per request.
+        on_complete (callable, optional): Called with the records of each request and
+        their outcomes once the request has completed.
+        retry_policy (RetryPolicy, optional): Retries and backoff of failed records.
+        on_failure (callable, optional): Called with each record that could not be
+        processed, its error and the number of attempts made.
+
+    Returns:
+        tuple: (success_count, total_count)
+    """
+    success_count = 0
+    total_count = 0
+
+    for batch in batched(records, batch_size):
+        limiter.acquire(len(batch))
+        total_count += len(batch)
+        outcomes = send_batch_to_microservice(batch, limiter, retry_policy, on_failure)
+        success_count += count_outcomes(batch, outcomes)
+        if on_complete is not None:
+            on_complete(batch, outcomes)
+
+    return success_count, total_count
+
+
+def send_records_concurrently(
+    records,
+    concurrency: int,
+    limiter: TokenBucket,
+    batch_size: int = 1,
+    on_complete=None,
+    retry_policy: RetryPolicy = None,
+    on_failure=None,
+):
+    """
+    Send records using a thread pool, keeping at most `concurrency` requests in flight.
+
+    Records are pulled from `records` only when a slot is free, so the CSV reader
+    keeps producing while requests are outstanding without buffering the whole file.
+    Waiting on the rate limiter only holds back new requests, not those in flight.
+
+    Args:
+        records (iterable of dict): The records to send to the microservice.
+        concurrency (int): Maximum number of requests in flight.
+        limiter (TokenBucket): Rate limiter paced per record sent.
+        batch_size (int): Number of records sent per request.
+        on_complete (callable, optional): Called from the calling thread with the
+        records of each request and their outcomes once the request has completed.
+        retry_policy (RetryPolicy, optional): Retries and backoff of failed records.
+        on_failure (callable, optional): Called with each record that could not be
+        processed, its error and the number of attempts made.
+        A record backing off keeps its slot but does not delay the other requests.
+
+    Returns:
+        tuple: (success_count, total_count)
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    success_count = 0
+    total_count = 0
+    in_flight = {}
+
+    def collect(done):
+        nonlocal success_count
+        for future in done:
+            batch = in_flight.pop(future)
+            outcomes = future.result()
+            success_count += count_outcomes(batch, outcomes)
+            if on_complete is not None:
+                on_complete(batch, outcomes)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in batched(records, batch_size):
+            if len(in_flight) >= concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            limiter.acquire(len(batch))
+            total_count += len(batch)
+            future = executor.submit(
+                send_batch_to_microservice, batch, limiter, retry_policy, on_failure
+            )
+            in_flight[future] = batch
+
+        collect(wait(in_flight).done)
+
+    return success_count, total_count
+
+
+def open_async_session(limit: int):
+    """
+    Create the aiohttp session to the microservice, with the MICROSERVICE pool timeouts.
+
+    Connections go through a Unix domain socket when MICROSERVICE_PATH is a unix:// URL.
+
+    Args:
+        limit (int): Maximum number of simultaneous connections.
+
+    Returns:
+        aiohttp.ClientSession: The session, to be used as an async context manager.
+    """
+    import aiohttp
+
+    from http_pool import UNIX_SCHEME, pool_settings, split_unix_url
+
+    settings = pool_settings("MICROSERVICE")
+    microservice_path = os.getenv("MICROSERVICE_PATH")
+    if microservice_path.startswith(UNIX_SCHEME):
+        socket_path, _ = split_unix_url(microservice_path)
+        connector = aiohttp.UnixConnector(path=socket_path, limit=limit)
+    else:
+        connector = aiohttp.TCPConnector(limit=limit)
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=settings["connect_timeout"], sock_read=settings["read_timeout"]
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def send_records_async(
+    session,
+    records,
+    concurrency: int,
+    limiter: TokenBucket,
+    batch_size: int = 1,
+    on_complete=None,
+    threaded_reader: bool = False,
+    retry_policy: RetryPolicy = None,
+    on_failure=None,
+):
+    """
+    Send records from a single asyncio event loop.
+
+    Rows are pulled from `records` only once a concurrency slot is free and the
+    rate limiter allows another request, so the CSV is streamed rather than loaded.
+
+    Args:
+        session (aiohttp.ClientSession): The session used to send the requests.
+        records (iterable of dict): The records to send to the microservice.
+        concurrency (int): Maximum number of requests in flight.
+        limiter (TokenBucket): Rate limiter paced per record sent.
+        batch_size (int): Number of records sent per request.
+        on_complete (callable, optional): Called from the event loop with the records
+        of each request and their outcomes once the request has completed.
+        threaded_reader (bool): Pull records from a thread, for sources whose reads
+        block until data arrives (see `reader_blocks`), so in-flight requests are not
+        stalled.
+        retry_policy (RetryPolicy, optional): Retries and backoff of failed records.
+        on_failure (callable, optional): Called with each record that could not be
+        processed, its error and the number of attempts made.
+        A record backing off keeps its slot but does not delay the other requests.
+
+    Returns:
+        tuple: (success_count, total_count)
+    """
+    import asyncio
+
+    success_count = 0
+    total_count = 0
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def send(batch):
+        nonlocal success_count
+        try:
+            outcomes = await send_batch_to_microservice_async(
+                session, batch, limiter, retry_policy, on_failure
+            )
+            success_count += count_outcomes(batch, outcomes)
+            if on_complete is not None:
+                on_complete(batch, outcomes)
+        finally:
+            slots.release()
+
+    loop = asyncio.get_running_loop()
+    batches = batched(records, batch_size)
+    while True:
+        if threaded_reader:
+            batch = await loop.run_in_executor(None, next, batches, None)
+        else:
+            batch = next(batches, None)
+        if batch is None:
+            break
+        await slots.acquire()
+        await limiter.acquire_async(len(batch))
+        total_count += len(batch)
+        task = asyncio.create_task(send(batch))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    return success_count, total_count
+
+
+class IngestionContext:
+    """
+    Command line arguments and the state shared by every file of an ingestion run.
+    """
+
+    def __init__(
+        self,
+        args,
+        limiter: TokenBucket,
+        checkpoint: Checkpoint = None,
+        seen_ids: SeenIds = None,
+        retry_policy: RetryPolicy = None,
+        dead_letters: DeadLetterFile = None,
+    ):
+        self.args = args
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.dead_letters = dead_letters
+        self.on_failure = None if dead_letters is None else dead_letters.write
+        self.checkpoint = checkpoint
+        self.seen_ids = seen_ids
+        self.callbacks = [
+            tracker.on_complete for tracker in (checkpoint, seen_ids) if tracker
+        ]
+
+    def on_complete(self, records, outcomes):
+        """
+        Notify the run's trackers that a request has completed.
+        """
+        for callback in self.callbacks:
+            callback(records, outcomes)
+
+
+def open_records(file_path: str, context: IngestionContext):
+    """
+    Open the records of a file with the reader selected on the command line.
+
+    Returns:
+        iterable of dict: The normalized and filtered records of the file.
+    """
+    args = context.args
+    columns, exclude_columns = args.columns, args.exclude_columns
+    if args.command == "replay":
+        records = read_dead_letters(file_path)
+    elif context.checkpoint is not None:
+        # Records already ingested are skipped by the checkpoint, which moves past them
+        records = context.checkpoint.track(
+            read_csv_file_with_offsets(
+                file_path,
+                args.filter,
+                context.checkpoint.offset,
+                columns,
+                exclude_columns,
+            ),
+            skip=context.seen_ids.seen if context.seen_ids is not None else None,
+        )
+    elif args.workers > 1:
+        records = read_csv_file_sharded(
+            file_path,
+            args.filter,
+            args.workers,
+            not args.unordered,
+            columns,
+            exclude_columns,
+        )
+    elif args.reader == "mmap":
+        records = read_csv_file_mmap(file_path, args.filter, columns, exclude_columns)
+    else:
+        records = read_csv_file(file_path, args.filter, columns, exclude_columns)
+
+    if context.seen_ids is not None and context.checkpoint is None:
+        records = context.seen_ids.skip_seen(records)
+    return records
+
+
+def ingest_file(file_path: str, context: IngestionContext):
+    """
+    Send the records of a file from a thread pool, or one request at a time.
+
+    Returns:
+        tuple: (success_count, total_count)
+    """
+    args = context.args
+    records = open_records(file_path, context)
+    if args.concurrency > 1:
+        counts = send_records_concurrently(
+            records,
+            args.concurrency,
+            context.limiter,
+            args.batch_size,
+            context.on_complete,
+            context.retry_policy,
+            context.on_failure,
+        )
+    else:
+        counts = send_records_sequentially(
+            records,
+            context.limiter,
+            args.batch_size,
+            context.on_complete,
+            context.retry_policy,
+            context.on_failure,
+        )
+    logger.info(f"Finished {file_path}: {counts[0]}/{counts[1]} records processed.")
+    return counts
+
+
+def reader_blocks(file_path: str, args):
+    """
+    Tell whether reading a file waits on a pipe, a decompression thread or worker
+    processes, so that the asyncio engine pulls its records from a thread instead
+    of blocking the event loop and the requests in flight.
+    """
+    return (
+        file_path == STDIN_PATH
+        or args.workers > 1
+        or detect_compression(file_path) is not None
+    )
+
+
+async def ingest_file_async(session, file_path: str, context: IngestionContext):
+    """
+    Send the records of a file from the asyncio event loop.
+
+    Returns:
+        tuple: (success_count, total_count)
+    """
+    args = context.args
+    counts = await send_records_async(
+        session,
+        open_records(file_path, context),
+        args.concurrency,
+        context.limiter,
+        args.batch_size,
+        context.on_complete,
+        threaded_reader=reader_blocks(file_path, args),
+        retry_policy=context.retry_policy,
+        on_failure=context.on_failure,
+    )
+    logger.info(f"Finished {file_path}: {counts[0]}/{counts[1]} records processed.")
+    return counts
+
+
+async def ingest_files_async(file_paths: list, context: IngestionContext):
+    """
+    Ingest up to --file-workers files at a time on one event loop and one session.
+
+    Returns:
+        list of tuple: (success_count, total_count) of each file.
+    """
+    import asyncio
+
+    args = context.args
+    file_slots = asyncio.Semaphore(args.file_workers)
+
+    async with open_async_session(args.concurrency * args.file_workers) as session:
+
+        async def ingest(file_path):
+            async with file_slots:
+                return await ingest_file_async(session, file_path, context)
+
+        return await asyncio.gather(*(ingest(path) for path in file_paths))
+
+
+def ingest_files(file_paths: list, context: IngestionContext):
+    """
+    Ingest files with the engine selected on the command line, up to --file-workers
+    files at a time. All files share the connection pool and the rate limiter.
+
+    Returns:
+        tuple: (success_count, total_count) over all files.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    args = context.args
+    if args.engine == "asyncio":
+        counts = asyncio.run(ingest_files_async(file_paths, context))
+    elif len(file_paths) == 1:
+        counts = [ingest_file(file_paths[0], context)]
+    else:
+        with ThreadPoolExecutor(max_workers=args.file_workers) as executor:
+            counts = list(
+                executor.map(
+                    lambda file_path: ingest_file(file_path, context), file_paths
+                )
+            )
+    return (
+        sum(success_count for success_count, _ in counts),
+        sum(total_count for _, total_count in counts),
+    )
+
+
+def main():
+    args = parse_arguments()
+    # Before configure_logging, which reads LOG_LEVEL
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    configure_logging(args.log_level)
+    EVENTS.sample_every.update(args.log_sample)
+    EVENTS.interval = args.log_interval
+    if args.dry_run:
+        dry_run(args.input_files, args.filter, args.columns, args.exclude_columns)
+        return
+
+    from http_pool import UNIX_SCHEME, get_session, split_unix_url, warm_session
+
+    try:
+        check_compression(compression_settings("MICROSERVICE")["compression"])
+    except (ValueError, RuntimeError) as err:
+        logger.error(f"MICROSERVICE_COMPRESSION: {err}")
+        sys.exit(1)
+    try:
+        json_codec.load_codec()
+    except (ValueError, ImportError) as err:
+        logger.error(f"JSON_BACKEND: {err}")
+        sys.exit(1)
+    microservice_path = os.getenv("MICROSERVICE_PATH")
+    if not microservice_path:
+        logger.error("MICROSERVICE_PATH is not set")
+        sys.exit(1)
+    if microservice_path.startswith(UNIX_SCHEME):
+        try:
+            split_unix_url(microservice_path)
+        except ValueError as err:
+            logger.error(f"MICROSERVICE_PATH: {err}")
+            sys.exit(1)
+    if args.batch_size > 1 and microservice_batch_path() is None:
+        logger.error(
+            "MICROSERVICE_BATCH_PATH must be set for --batch-size when "
+            "MICROSERVICE_PATH does not end with /process_record"
+        )
+        sys.exit(1)
+
+    if args.engine == "threads":
+        connections = args.concurrency * args.file_workers
+        get_session("MICROSERVICE", min_pool_size=connections)
+        warm_session("MICROSERVICE", microservice_path, connections=connections)
+
+    checkpoint = None
+    if args.checkpoint:
+        # Failed records are only skipped on resume if the dead-letter file has them
+        checkpoint = Checkpoint(
+            args.checkpoint,
+            args.input_files[0],
+            args.checkpoint_interval,
+            settle_failures=bool(args.dead_letter),
+        )
+        try:
+            checkpoint.load()
+        except ValueError as err:
+            logger.error(str(err))
+            sys.exit(1)
+    seen_ids = SeenIds(args.seen_ids) if args.seen_ids else None
+    limiter = TokenBucket(rate=args.rate, burst=args.burst)
+    retry_policy = RetryPolicy(
+        args.retries, args.retry_backoff, args.retry_max_backoff, args.retry_deadline
+    )
+    dead_letters = DeadLetterFile(args.dead_letter) if args.dead_letter else None
+    context = IngestionContext(
+        args, limiter, checkpoint, seen_ids, retry_policy, dead_letters
+    )
+
+    STATS.start_reporting(args.progress_interval)
+    try:
+        success_count, total_count = ingest_files(args.input_files, context)
+    finally:
+        STATS.stop_reporting()
+        if checkpoint is not None:
+            checkpoint.save()
+        if seen_ids is not None:
+            seen_ids.close()
+        if dead_letters is not None:
+            dead_letters.close()
+        EVENTS.report()
+        STATS.log("Summary")
+        if args.summary:
+            STATS.write_summary(
+                args.summary, {"files": args.input_files, "events": EVENTS.counts}
+            )
+
+    if seen_ids is not None and seen_ids.skipped:
+        logger.info(f"Skipped {seen_ids.skipped} records already ingested.")
+    if dead_letters is not None and dead_letters.written:
+        logger.info(
+            f"Wrote {dead_letters.written} failed records to {args.dead_letter}."
+        )
     logger.info(
         f"Ingestion completed. {success_count}/{total_count} records processed successfully."
     )
@@ -0,0 +1,181 @@
+import io
+import os
+import queue
+import sys
+import threading
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+MAGIC_NUMBERS = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+DECOMPRESS_BLOCK_SIZE = 1 << 20
+DECOMPRESS_QUEUE_BLOCKS = 8
+DECOMPRESS_JOIN_TIMEOUT = 1.0
+STDIN_PATH = "-"
+
+
+def detect_compression(file_path: str):
+    """
+    Detect the compression of a file from its extension, or else its magic bytes.
+
+    Args:
+        file_path (str): The path to the file. Standard input is not inspected.
+
+    Returns:
+        str: One of "gzip", "bz2", "xz" or "zstd", or None for an uncompressed file.
+    """
+    if file_path == STDIN_PATH:
+        return None
+    compression = COMPRESSION_SUFFIXES.get(os.path.splitext(file_path)[1].lower())
+    if compression is not None:
+        return compression
+    try:
+        with open(file=file_path, mode="rb") as input_file:
+            return compression_from_magic(input_file.read(6))
+    except OSError:
+        return None
+
+
+def compression_from_magic(head: bytes):
+    """
+    Return the compression matching the first bytes of a stream, or None.
+    """
+    for magic, compression in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_decompressed(source, compression: str):
+    """
+    Open a compressed file as a stream of decompressed bytes.
+
+    Args:
+        source (str or file object): The path to the file, or a binary stream.
+        compression (str): One of "gzip", "bz2", "xz" or "zstd".
+
+    Raises:
+        RuntimeError: For zstd files when the zstandard package is not installed.
+    """
+    # Imported on first use, so that reading plain files does not pay for them
+    if compression == "gzip":
+        import gzip
+
+        return gzip.open(source, mode="rb")
+    if compression == "bz2":
+        import bz2
+
+        return bz2.open(source, mode="rb")
+    if compression == "xz":
+        import lzma
+
+        return lzma.open(source, mode="rb")
+    try:
+        import zstandard
+    except ImportError as err:
+        raise RuntimeError("Reading zstd input requires the zstandard package") from err
+    if isinstance(source, str):
+        source = open(file=source, mode="rb")
+    return zstandard.ZstdDecompressor().stream_reader(source, closefd=True)
+
+
+class ThreadedDecompressor(io.RawIOBase):
+    """
+    Raw stream decompressing a file on a background thread.
+
+    Decompressed blocks are handed over through a bounded queue, so decompression
+    (which releases the GIL in zlib, bz2, lzma and zstandard) overlaps with parsing
+    while keeping at most a few blocks in memory. Blocks are read with read1, so
+    data from a pipe is passed on as soon as it is decompressed.
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.read_block = getattr(stream, "read1", stream.read)
+        self.blocks = queue.Queue(maxsize=DECOMPRESS_QUEUE_BLOCKS)
+        self.block = memoryview(b"")
+        self.finished = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._decompress, daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _decompress(self):
+        try:
+            while not self.stopped.is_set():
+                block = self.read_block(DECOMPRESS_BLOCK_SIZE)
+                if not block:
+                    break
+                self._put(block)
+        except Exception as err:
+            self._put(err)
+        self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.block:
+            if self.finished:
+                return 0
+            item = self.blocks.get()
+            if item is None:
+                self.finished = True
+                return 0
+            if isinstance(item, Exception):
+                self.finished = True
+                raise item
+            self.block = memoryview(item)
+        size = min(len(buffer), len(self.block))
+        buffer[:size] = self.block[:size]
+        self.block = self.block[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.stopped.set()
+            # The thread may be blocked reading a pipe; it is a daemon thread
+            self.thread.join(timeout=DECOMPRESS_JOIN_TIMEOUT)
+            self.stream.close()
+        super().close()
+
+
+def open_input(file_path: str):
+    """
+    Open an input file for binary reading, decompressing it on the fly if needed.
+
+    Args:
+        file_path (str): The path to the file, plain or gzip/bz2/xz/zstd compressed,
+        or "-" for standard input. The compression of standard input is detected
+        from its first bytes.
+
+    Returns:
+        io.BufferedReader: The (decompressed) content of the file.
+    """
+    if file_path == STDIN_PATH:
+        # Closing this reader leaves the process's standard input open
+        source = open(file=sys.stdin.fileno(), mode="rb", closefd=False)
+        compression = compression_from_magic(source.peek(6)[:6])
+    else:
+        source = file_path
+        compression = detect_compression(file_path)
+
+    if compression is None:
+        if file_path == STDIN_PATH:
+            return source
+        return open(file=file_path, mode="rb")
+    return io.BufferedReader(
+        ThreadedDecompressor(open_decompressed(source, compression)),
+        buffer_size=DECOMPRESS_BLOCK_SIZE,
+    )
@@ -0,0 +1,76 @@
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import json_codec
+from compressed_input import open_input
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetterFile:
+    """
+    Append-only NDJSON file of the records that could not be processed.
+
+    Each line holds the record as it was sent, the kind of error it last failed with
+    (e.g. timeout, connection or http_400), the number of attempts made and when it
+    failed, so that `replay` can send the records again without re-reading the input.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.written = 0
+        self._lock = threading.Lock()
+        self._file = open(file=path, mode="ab")
+
+    def write(self, record: dict, error: str, attempts: int):
+        """
+        Append a failed record to the file.
+        """
+        line = json_codec.dumps(
+            {
+                "record": record,
+                "error": error,
+                "attempts": attempts,
+                "failed_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        with self._lock:
+            self._file.write(line + b"\n")
+            self._file.flush()
+            self.written += 1
+
+    def close(self):
+        """
+        Flush the file to disk and close it.
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+def read_dead_letters(file_path: str):
+    """
+    Read the records of a dead-letter file written by `DeadLetterFile`.
+
+    Args:
+        file_path (str): The path to the file, possibly compressed, or "-" for
+        standard input. Malformed lines are logged and skipped.
+
+    Yields:
+        dict: The failed records, in file order.
+    """
+    with open_input(file_path) as dead_letters:
+        for line_number, line in enumerate(dead_letters, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json_codec.loads(line)["record"]
+            except (ValueError, KeyError, TypeError) as err:
+                logger.error(
+                    "Skipping malformed line %d of %s: %s", line_number, file_path, err
+                )
+                continue
+            yield record
@@ -0,0 +1,239 @@
+import os
+import socket
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_KEEPALIVE = 60
+UNIX_SCHEME = "unix://"
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default timeout and TCP keep-alive to every pooled connection.
+    """
+
+    def __init__(self, timeout, keepalive, **kwargs):
+        self.timeout = timeout
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        socket_options = list(HTTPConnection.default_socket_options)
+        if self.keepalive > 0:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                socket_options.append(
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive)
+                )
+        kwargs["socket_options"] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def split_unix_url(url: str):
+    """
+    Split a ``unix://SOCKET_PATH:HTTP_PATH`` URL, e.g.
+    ``unix:///run/populate.sock:/process_record``.
+
+    Returns:
+        tuple: (socket path, HTTP path)
+
+    Raises:
+        ValueError: If the URL has no socket path or no HTTP path.
+    """
+    socket_path, separator, http_path = url[len(UNIX_SCHEME) :].partition(":/")
+    if not socket_path or not separator:
+        raise ValueError(
+            f"{url!r} must look like unix:///path/to/socket.sock:/http/path"
+        )
+    return socket_path, "/" + http_path
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """
+    HTTP connection over a Unix domain socket.
+    """
+
+    def __init__(self, socket_path: str, **kwargs):
+        # TCP socket options such as keep-alive do not apply to Unix sockets
+        kwargs.pop("socket_options", None)
+        super().__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class UnixHTTPConnectionPool(HTTPConnectionPool):
+    """
+    Pool of HTTP connections over a Unix domain socket.
+    """
+
+    ConnectionCls = UnixHTTPConnection
+
+    def __init__(self, socket_path: str, **kwargs):
+        super().__init__("localhost", **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self):
+        self.num_connections += 1
+        return self.ConnectionCls(
+            self.socket_path, timeout=self.timeout.connect_timeout, **self.conn_kw
+        )
+
+
+class UnixSocketAdapter(PooledHTTPAdapter):
+    """
+    Adapter sending ``unix://SOCKET_PATH:HTTP_PATH`` URLs over pooled Unix socket
+    connections, skipping the TCP loopback stack for co-located services.
+    """
+
+    def __init__(self, timeout, **kwargs):
+        self._unix_pools = {}
+        self._unix_pools_lock = threading.Lock()
+        super().__init__(timeout=timeout, keepalive=0, **kwargs)
+
+    def _unix_pool(self, url: str):
+        socket_path, _ = split_unix_url(url)
+        with self._unix_pools_lock:
+            pool = self._unix_pools.get(socket_path)
+            if pool is None:
+                pool = UnixHTTPConnectionPool(
+                    socket_path, maxsize=self._pool_maxsize, block=self._pool_block
+                )
+                self._unix_pools[socket_path] = pool
+            return pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._unix_pool(request.url)
+
+    def get_connection(self, url, proxies=None):
+        return self._unix_pool(url)
+
+    def request_url(self, request, proxies):
+        return split_unix_url(request.url)[1]
+
+    def close(self):
+        with self._unix_pools_lock:
+            for pool in self._unix_pools.values():
+                pool.close()
+            self._unix_pools.clear()
+        super().close()
+
+
+def pool_settings(prefix: str):
+    """
+    Read the connection pool settings of an upstream from the environment.
+
+    For a prefix such as ``ANALYTICS`` the variables read are ``ANALYTICS_POOL_SIZE``,
+    ``ANALYTICS_CONNECT_TIMEOUT``, ``ANALYTICS_READ_TIMEOUT`` and ``ANALYTICS_KEEPALIVE``
+    (idle seconds before TCP keep-alive probes, 0 disables them).
+
+    Args:
+        prefix (str): The environment variable prefix of the upstream.
+
+    Returns:
+        dict: pool_size, connect_timeout, read_timeout and keepalive values.
+    """
+    return {
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        "connect_timeout": float(
+            os.getenv(f"{prefix}_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)
+        ),
+        "read_timeout": float(
+            os.getenv(f"{prefix}_READ_TIMEOUT", DEFAULT_READ_TIMEOUT)
+        ),
+        "keepalive": int(os.getenv(f"{prefix}_KEEPALIVE", DEFAULT_KEEPALIVE)),
+    }
+
+
+def get_session(prefix: str, min_pool_size: int = 0):
+    """
+    Return the shared session of an upstream, creating its connection pool on first use.
+
+    Args:
+        prefix (str): The environment variable prefix of the upstream.
+        min_pool_size (int): Lower bound for the pool size, e.g. the number of
+        concurrent senders. Only used when the session is created.
+
+    Returns:
+        requests.Session: A session whose connections are reused across requests.
+    """
+    with _sessions_lock:
+        session = _sessions.get(prefix)
+        if session is None:
+            settings = pool_settings(prefix)
+            pool_size = max(settings["pool_size"], min_pool_size)
+            adapter = PooledHTTPAdapter(
+                timeout=(settings["connect_timeout"], settings["read_timeout"]),
+                keepalive=settings["keepalive"],
+                pool_connections=1,
+                pool_maxsize=pool_size,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.mount(
+                UNIX_SCHEME,
+                UnixSocketAdapter(
+                    timeout=(settings["connect_timeout"], settings["read_timeout"]),
+                    pool_connections=1,
+                    pool_maxsize=pool_size,
+                ),
+            )
+            _sessions[prefix] = session
+        return session
+
+
+def warm_session(prefix: str, url: str, connections: int = 1, headers: dict = None):
+    """
+    Open connections to an upstream ahead of the first real request.
+
+    An OPTIONS request is sent over each connection, which servers answer without
+    running an endpoint (Flask does for every route); the response status is
+    ignored since only the established (and TLS-negotiated) connection matters.
+
+    Args:
+        prefix (str): The environment variable prefix of the upstream.
+        url (str): Any URL served by the upstream.
+        connections (int): Number of connections to open concurrently, at most the
+        upstream's configured pool size.
+        headers (dict, optional): Headers of the requests, e.g. authentication.
+    """
+    session = get_session(prefix)
+    # Connections beyond the configured size are opened on demand
+    connections = min(connections, pool_settings(prefix)["pool_size"])
+
+    def warm():
+        try:
+            session.options(url, headers=headers)
+        except requests.exceptions.RequestException as err:
+            logger.warning(f"Could not warm connection pool for {prefix}: {err}")
+
+    threads = [threading.Thread(target=warm) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
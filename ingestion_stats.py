@@ -0,0 +1,187 @@
+import json
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_PERCENTILES = (50, 95, 99)
+LATENCY_BUCKET_GROWTH = 1.02
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in logarithmic buckets.
+
+    Each bucket is 2% wider than the previous one, so percentiles are accurate to
+    2% with a few hundred buckets however many requests are recorded.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        microseconds = max(seconds * 1e6, 1.0)
+        bucket = math.ceil(math.log(microseconds, LATENCY_BUCKET_GROWTH))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent: float):
+        """
+        Return the latency in seconds below which `percent` % of the requests fall,
+        or None if no request was recorded.
+        """
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(LATENCY_BUCKET_GROWTH**bucket / 1e6, self.max)
+        return self.max
+
+
+class IngestionStats:
+    """
+    Throughput, in-flight requests, request latency and errors of an ingestion run.
+
+    Updated from the sending threads or event loop, and logged periodically from a
+    background thread once `start_reporting` is called.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.clock_start = time.perf_counter()
+        self.succeeded = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = {}
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._stop_reporting = threading.Event()
+        self._reporter = None
+
+    @contextmanager
+    def request(self):
+        """
+        Track one request to the microservice while the block runs.
+        """
+        with self._lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.in_flight -= 1
+                self.requests += 1
+                self.latency.add(elapsed)
+
+    def error(self, kind: str, count: int = 1):
+        """
+        Count `count` records that failed with an error of a type, e.g. timeout or http_503.
+        """
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + count
+
+    def completed(self, outcomes):
+        """
+        Count the records of a completed request.
+        """
+        succeeded = sum(outcomes)
+        with self._lock:
+            self.succeeded += succeeded
+            self.failed += len(outcomes) - succeeded
+
+    def summary(self):
+        """
+        Return the statistics so far as a JSON-serializable dict.
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self.clock_start
+            records = self.succeeded + self.failed
+            latency = {
+                f"p{percent}": self.latency.percentile(percent)
+                for percent in LATENCY_PERCENTILES
+            }
+            latency["mean"] = (
+                self.latency.total / self.latency.count if self.latency.count else None
+            )
+            latency["max"] = self.latency.max if self.latency.count else None
+            return {
+                "started_at": self.started_at,
+                "elapsed_seconds": elapsed,
+                "records": records,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "records_per_second": records / elapsed if elapsed > 0 else 0.0,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "latency_seconds": latency,
+                "errors": dict(self.errors),
+            }
+
+    def log(self, label: str = "Progress"):
+        """
+        Log throughput, in-flight requests, latency percentiles and errors so far.
+        """
+        summary = self.summary()
+        latency = ", ".join(
+            f"{name} {seconds * 1000:.1f}ms"
+            for name, seconds in summary["latency_seconds"].items()
+            if seconds is not None and name.startswith("p")
+        )
+        errors = ", ".join(
+            f"{kind}={count}" for kind, count in sorted(summary["errors"].items())
+        )
+        logger.info(
+            "%s: %d records (%d succeeded, %d failed) in %.1fs, %.1f records/s, "
+            "%d in flight, latency %s, errors: %s",
+            label,
+            summary["records"],
+            summary["succeeded"],
+            summary["failed"],
+            summary["elapsed_seconds"],
+            summary["records_per_second"],
+            summary["in_flight"],
+            latency or "n/a",
+            errors or "none",
+        )
+
+    def start_reporting(self, interval: float):
+        """
+        Log progress every `interval` seconds from a background thread.
+        """
+        if interval <= 0:
+            return
+
+        def report():
+            while not self._stop_reporting.wait(interval):
+                self.log()
+
+        self._reporter = threading.Thread(target=report, daemon=True)
+        self._reporter.start()
+
+    def stop_reporting(self):
+        self._stop_reporting.set()
+        if self._reporter is not None:
+            self._reporter.join()
+
+    def write_summary(self, path: str, extra: dict = None):
+        """
+        Write the final statistics, merged with `extra`, to a JSON file.
+        """
+        summary = {**self.summary(), **(extra or {})}
+        with open(file=path, mode="w", encoding="utf8") as summary_file:
+            json.dump(summary, summary_file, indent=2)
@@ -0,0 +1,122 @@
+import json
+import os
+
+JSON_BACKENDS = ("orjson", "ujson", "json")
+
+
+def _mapping_default(obj):
+    # Compact records (see record_type) read like dicts but are not dicts. orjson
+    # serializes them directly as dataclasses, the other backends need a dict
+    if hasattr(obj, "keys"):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _orjson_codec():
+    import orjson
+
+    # Rows with more fields than the header keep the extras under a None key
+    options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=options)
+
+    return dumps, orjson.loads
+
+
+def _ujson_codec():
+    import ujson
+
+    def dumps(obj):
+        return ujson.dumps(obj, ensure_ascii=False, default=_mapping_default).encode(
+            "utf8"
+        )
+
+    return dumps, ujson.loads
+
+
+def _stdlib_codec():
+    def dumps(obj):
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), default=_mapping_default
+        ).encode("utf8")
+
+    return dumps, json.loads
+
+
+CODEC_FACTORIES = {
+    "orjson": _orjson_codec,
+    "ujson": _ujson_codec,
+    "json": _stdlib_codec,
+}
+
+
+def load_codec(backend: str = None):
+    """
+    Load the functions serializing and parsing JSON with a backend.
+
+    Args:
+        backend (str, optional): orjson, ujson or json. By default, the JSON_BACKEND
+        environment variable, or else the fastest backend installed.
+
+    Returns:
+        tuple: (backend name, dumps returning bytes, loads accepting bytes or str)
+
+    Raises:
+        ValueError: If the backend is unknown.
+        ImportError: If the requested backend is not installed.
+    """
+    backend = backend or os.getenv("JSON_BACKEND")
+    if backend:
+        if backend not in CODEC_FACTORIES:
+            raise ValueError(
+                f"Unknown JSON backend {backend!r}, expected one of {JSON_BACKENDS}"
+            )
+        return (backend, *CODEC_FACTORIES[backend]())
+
+    for name in JSON_BACKENDS:
+        try:
+            return (name, *CODEC_FACTORIES[name]())
+        except ImportError:
+            continue
+
+
+def available_codecs():
+    """
+    Return the codec of every installed backend, fastest first.
+
+    Returns:
+        dict: Backend name to (dumps, loads).
+    """
+    codecs = {}
+    for name in JSON_BACKENDS:
+        try:
+            codecs[name] = CODEC_FACTORIES[name]()
+        except ImportError:
+            continue
+    return codecs
+
+
+BACKEND = None
+
+
+def _load_default_codec():
+    global BACKEND, dumps, loads
+    BACKEND, dumps, loads = load_codec()
+
+
+# The backend is imported on the first call, which then replaces these functions
+def dumps(obj):
+    """
+    Serialize an object to JSON bytes.
+    """
+    _load_default_codec()
+    return dumps(obj)
+
+
+def loads(data):
+    """
+    Parse JSON bytes or str.
+    """
+    _load_default_codec()
+    return loads(data)
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_REPORT_INTERVAL = 10.0
+DEFAULT_SAMPLE_EVERY = {
+    "invalid_category": 10_000,
+    "filtered": 10_000,
+    "passed": 10_000,
+    "succeeded": 10_000,
+    "failed": 1,
+    "http_error": 1,
+    "timeout": 1,
+    "connection": 1,
+    "request_error": 1,
+    "invalid_response": 1,
+    "retry": 100,
+}
+
+
+def configure_logging(level: str = None):
+    """
+    Configure the root logger, at `level` or else the LOG_LEVEL environment variable.
+
+    Args:
+        level (str, optional): One of DEBUG, INFO, WARNING or ERROR. Defaults to
+        LOG_LEVEL, or INFO when it is not set.
+    """
+    level = (level or os.getenv("LOG_LEVEL") or DEFAULT_LOG_LEVEL).upper()
+    logging.basicConfig(
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    logging.getLogger().setLevel(level)
+
+
+def parse_sample_rates(sample_values: list):
+    """
+    Parse EVENT=N sampling options.
+
+    Args:
+        sample_values (list of str): Expressions such as ``filtered=10000``. 0 turns
+        off the logs of an event type, 1 logs every event.
+
+    Returns:
+        dict: Event type to N, one event logged every N.
+
+    Raises:
+        ValueError: If an expression is not EVENT=N with N a non-negative integer.
+    """
+    sample_every = {}
+    for sample_value in sample_values or []:
+        event, _, every = sample_value.partition("=")
+        try:
+            every = int(every)
+        except ValueError:
+            every = -1
+        if not event or every < 0:
+            raise ValueError(
+                f"Log sampling {sample_value!r} must be EVENT=N with N >= 0"
+            )
+        sample_every[event] = every
+    return sample_every
+
+
+class EventCounters:
+    """
+    Thread-safe per-event-type counters replacing per-record log lines.
+
+    Every event is counted, and only one in N of each type is reported as sampled
+    so that the caller logs it. The totals are logged every `interval` seconds and
+    by `report` at the end of the run.
+    """
+
+    def __init__(self, sample_every: dict = None, interval: float = None):
+        self.sample_every = {**DEFAULT_SAMPLE_EVERY, **(sample_every or {})}
+        self.interval = interval
+        self.counts = {}
+        self.reported_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, event: str, count: int = 1):
+        """
+        Count `count` events of a type.
+
+        Returns:
+            bool: True if this event is sampled and should be logged by the caller.
+        """
+        with self._lock:
+            seen = self.counts.get(event, 0)
+            self.counts[event] = seen + count
+            report = (
+                self.interval is not None
+                and time.monotonic() - self.reported_at >= self.interval
+            )
+            if report:
+                self.reported_at = time.monotonic()
+        if report:
+            self.report()
+        every = self.sample_every.get(event, 1)
+        # Sample the first event of a type, then one every N
+        return every > 0 and (seen - 1) // every != (seen + count - 1) // every
+
+    def merge(self, counts: dict):
+        """
+        Add counts collected elsewhere, e.g. in a worker process.
+        """
+        with self._lock:
+            for event, count in counts.items():
+                self.counts[event] = self.counts.get(event, 0) + count
+
+    def report(self):
+        """
+        Log the number of events of each type so far.
+        """
+        with self._lock:
+            counts = dict(self.counts)
+        if counts:
+            logger.info(
+                "Events: %s",
+                ", ".join(f"{event}={count}" for event, count in counts.items()),
+            )
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS_CODES = (429, 503)
+DEFAULT_THROTTLE_PAUSE = 1.0
+MAX_THROTTLE_PAUSE = 60.0
+MIN_RATE_FRACTION = 0.05
+RECOVERY_FRACTION = 0.01
+
+
+def retry_after_seconds(value):
+    """
+    Parse the value of a Retry-After header.
+
+    Args:
+        value (str): Either a number of seconds or an HTTP date.
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that paces requests at `rate` tokens per second.
+
+    Up to `burst` tokens can be spent at once after an idle period. Tokens are
+    reserved ahead of time, so concurrent callers queue up behind each other
+    instead of all waking up together. When the service signals overload the
+    bucket pauses and halves its rate, then climbs back to `rate` on successes.
+    With `rate` set to None there is no steady ceiling and only the pauses apply.
+    """
+
+    def __init__(self, rate: float = None, burst: float = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttle_pause = DEFAULT_THROTTLE_PAUSE
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float):
+        """
+        Take `tokens` from the bucket and return how long to wait before using them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait_time = max(0.0, self.paused_until - now)
+            if self.rate is None:
+                return wait_time
+
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens < 0:
+                wait_time = max(wait_time, -self.tokens / self.rate)
+            return wait_time
+
+    def acquire(self, tokens: float = 1):
+        """
+        Block the calling thread until `tokens` may be spent.
+        """
+        wait_time = self._reserve(tokens)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def acquire_async(self, tokens: float = 1):
+        """
+        Suspend the calling coroutine until `tokens` may be spent.
+        """
+        wait_time = self._reserve(tokens)
+        if wait_time > 0:
+            import asyncio
+
+            await asyncio.sleep(wait_time)
+
+    def observe(self, status_code: int, retry_after: str = None):
+        """
+        Feed the status of a response back into the limiter.
+
+        Args:
+            status_code (int): The HTTP status code of the response.
+            retry_after (str, optional): The Retry-After header of the response.
+        """
+        if status_code in THROTTLE_STATUS_CODES:
+            self.on_throttled(retry_after_seconds(retry_after))
+        elif status_code < 400:
+            self.on_success()
+
+    def on_throttled(self, retry_after: float = None):
+        """
+        Back off after the service answered 429 or 503.
+
+        Args:
+            retry_after (float, optional): Seconds requested by the Retry-After header.
+            Without it the pause doubles on each consecutive throttle.
+        """
+        with self._lock:
+            if retry_after is None:
+                pause = self.throttle_pause
+                self.throttle_pause = min(self.throttle_pause * 2, MAX_THROTTLE_PAUSE)
+            else:
+                pause = retry_after
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            if self.rate is not None:
+                self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            logger.warning(
+                f"Service is throttling, pausing for {pause:.2f}s at {self.rate or 'unlimited'} records/s"
+            )
+
+    def on_success(self):
+        """
+        Recover the rate after the service accepted a request.
+        """
+        with self._lock:
+            self.throttle_pause = DEFAULT_THROTTLE_PAUSE
+            if self.rate is not None and self.rate < self.max_rate:
+                self.rate = min(
+                    self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION
+                )
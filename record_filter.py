@@ -0,0 +1,126 @@
+import re
+
+FILTER_EXPRESSION = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)(!=|>=|<=|=|>|<|~)(.*)$")
+NUMERIC_OPERATORS = {
+    ">": lambda value, bound: value > bound,
+    ">=": lambda value, bound: value >= bound,
+    "<": lambda value, bound: value < bound,
+    "<=": lambda value, bound: value <= bound,
+}
+
+
+def equality_values(value: str):
+    """
+    Return the values a filter value is equal to, i.e. the string and, when it is
+    an integer, its int form so that it matches cast columns such as `id`.
+    """
+    values = {value}
+    try:
+        values.add(int(value))
+    except ValueError:
+        pass
+    return values
+
+
+def as_number(value):
+    """
+    Return a row value as a number, or None if it is not numeric.
+    """
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compile_filter(filter_values: list):
+    """
+    Compile filter expressions into a single row predicate.
+
+    Each expression is either a bare value, matched against every column as before,
+    or scoped to a column:
+        - ``column=value`` / ``column!=value``: equality
+        - ``column>n``, ``column>=n``, ``column<n``, ``column<=n``: numeric comparison
+        - ``column~regex``: regular expression search
+
+    A row matches if any expression matches. Equalities are grouped into one hash set
+    per column and checked first, then bare values, comparisons and regexes.
+
+    Args:
+        filter_values (list of str): The filter expressions.
+
+    Returns:
+        callable: Takes a normalized row (dict) and returns True if it matches. Its
+        `columns` attribute is the set of columns the filters read, or None when a
+        bare value makes every column relevant.
+
+    Raises:
+        ValueError: If a comparison bound is not a number or a regex is invalid.
+    """
+    equals = {}
+    not_equals = []
+    comparisons = []
+    patterns = []
+    bare_values = set()
+
+    for filter_value in filter_values:
+        match = FILTER_EXPRESSION.match(filter_value)
+        if match is None:
+            bare_values.add(filter_value)
+            continue
+
+        column, operator, value = match.groups()
+        if operator == "=":
+            equals.setdefault(column, set()).update(equality_values(value))
+        elif operator == "!=":
+            not_equals.append((column, equality_values(value)))
+        elif operator == "~":
+            try:
+                patterns.append((column, re.compile(value)))
+            except re.error as err:
+                raise ValueError(
+                    f"Invalid regex in filter {filter_value!r}: {err}"
+                ) from err
+        else:
+            try:
+                bound = float(value)
+            except ValueError as err:
+                raise ValueError(
+                    f"Filter {filter_value!r} needs a numeric value"
+                ) from err
+            comparisons.append((column, NUMERIC_OPERATORS[operator], bound))
+
+    equals = tuple(equals.items())
+    not_equals = tuple(not_equals)
+    comparisons = tuple(comparisons)
+    patterns = tuple(patterns)
+
+    def matches(row: dict):
+        for column, values in equals:
+            if row.get(column) in values:
+                return True
+        if bare_values:
+            for value in row.values():
+                if not isinstance(value, list) and value in bare_values:
+                    return True
+        for column, values in not_equals:
+            if column in row and row[column] not in values:
+                return True
+        for column, compare, bound in comparisons:
+            value = as_number(row.get(column))
+            if value is not None and compare(value, bound):
+                return True
+        for column, pattern in patterns:
+            value = row.get(column)
+            if value is not None and pattern.search(str(value)):
+                return True
+        return False
+
+    if bare_values:
+        matches.columns = None
+    else:
+        matches.columns = frozenset(
+            column for column, *_ in equals + not_equals + comparisons + patterns
+        )
+    return matches
@@ -0,0 +1,92 @@
+import functools
+import keyword
+from collections.abc import Mapping
+
+
+class Record:
+    """
+    Base of the compact record types built by `record_type`.
+
+    Records keep their fields in slots instead of a per-row dict, and can be read
+    like a dict (``record["id"]``, ``get``, ``in``, ``items``) by the filters,
+    trackers and logs. They are dataclasses, so orjson serializes them straight to a
+    JSON object; the other JSON backends convert them with dict().
+    """
+
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, key) for key in self._fields]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self._fields]
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, Mapping)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __reduce__(self):
+        # Generated classes cannot be pickled by name, e.g. to leave a worker process
+        return _rebuild_record, (self._fields, tuple(self.values()))
+
+
+@functools.lru_cache(maxsize=None)
+def record_type(keys: tuple):
+    """
+    Build the compact record type of rows with the given keys, once per set of keys.
+
+    Args:
+        keys (tuple of str): The keys of the rows, in order.
+
+    Returns:
+        type: A slotted dataclass deriving from `Record`, whose fields are the keys
+        in order, or None if a key cannot be an attribute name (e.g. it is not an
+        identifier, or shadows a `Record` method). Such rows stay dicts.
+    """
+    for key in keys:
+        if (
+            not isinstance(key, str)
+            or not key.isidentifier()
+            or keyword.iskeyword(key)
+            or key.startswith("_")
+            or hasattr(Record, key)
+        ):
+            return None
+    if len(set(keys)) != len(keys):
+        return None
+
+    # Imported here as it loads inspect, which --help does not need
+    import dataclasses
+
+    record_class = dataclasses.make_dataclass(
+        "Record", keys, bases=(Record,), slots=True, eq=False
+    )
+    record_class.__module__ = __name__
+    record_class._fields = keys
+    return record_class
+
+
+def _rebuild_record(keys: tuple, values: tuple):
+    return record_type(keys)(*values)
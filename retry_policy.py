@@ -0,0 +1,73 @@
+import random
+import time
+
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+# request_error covers invalid URLs, headers and redirect loops, which fail again
+RETRYABLE_ERRORS = ("timeout", "connection")
+RETRYABLE_STATUS_CODES = (408, 429)
+
+
+def is_retryable(error: str):
+    """
+    Tell whether a failed send is worth retrying.
+
+    Args:
+        error (str): The kind of error, e.g. timeout, connection or http_503.
+
+    Returns:
+        bool: True for timeouts, connection errors, 408, 429 and 5xx responses.
+        Other 4xx responses and other request errors would fail again and are not
+        retried.
+    """
+    if error in RETRYABLE_ERRORS:
+        return True
+    if error.startswith("http_"):
+        status_code = int(error[len("http_") :])
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return False
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by a number of retries and a
+    deadline per record.
+
+    The n-th retry waits a random time between 0 and backoff * 2**n seconds, capped
+    at max_backoff, so that clients failing together do not retry together.
+    """
+
+    def __init__(
+        self,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        deadline: float = None,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+
+    def delay(self, attempt: int, started: float):
+        """
+        Return how long to wait before retrying after a failed attempt.
+
+        Args:
+            attempt (int): The number of the attempt that failed, from 0.
+            started (float): time.monotonic() when the first attempt started.
+
+        Returns:
+            float: Seconds to wait, or None if the record must not be retried
+            because the retries are exhausted or the retry would end past the deadline.
+        """
+        if attempt >= self.retries:
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        if (
+            self.deadline is not None
+            and time.monotonic() + delay - started >= self.deadline
+        ):
+            return None
+        return delay
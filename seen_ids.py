@@ -0,0 +1,100 @@
+import logging
+import mmap
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEEN_IDS_INITIAL_SIZE = 1 << 20
+SEEN_IDS_MAX_ID = (1 << 34) - 1
+
+
+class SeenIds:
+    """
+    Persistent set of ingested record ids, stored as a memory-mapped bitmap file.
+
+    Bit n of the file is set once record id n has been ingested, so the file takes
+    one bit per id up to the largest id seen (125 MB for ids up to 1 billion). The
+    file is sparse and memory-mapped: opening it is instant, and only the pages
+    covering ids that are actually looked up are read into memory. Ids that are not
+    integers between 0 and SEEN_IDS_MAX_ID are never considered seen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            os.ftruncate(self._fd, SEEN_IDS_INITIAL_SIZE)
+        self._bitmap = mmap.mmap(self._fd, 0)
+
+    def _grow(self, size: int):
+        size = max(size, 2 * len(self._bitmap))
+        size = min(
+            -(-size // SEEN_IDS_INITIAL_SIZE) * SEEN_IDS_INITIAL_SIZE,
+            (SEEN_IDS_MAX_ID >> 3) + 1,
+        )
+        self._bitmap.close()
+        os.ftruncate(self._fd, size)
+        self._bitmap = mmap.mmap(self._fd, 0)
+
+    def __contains__(self, record_id):
+        if not isinstance(record_id, int) or not 0 <= record_id <= SEEN_IDS_MAX_ID:
+            return False
+        index, bit = divmod(record_id, 8)
+        with self._lock:
+            return index < len(self._bitmap) and bool(self._bitmap[index] >> bit & 1)
+
+    def add(self, record_id):
+        """
+        Mark a record id as ingested.
+        """
+        if not isinstance(record_id, int) or not 0 <= record_id <= SEEN_IDS_MAX_ID:
+            return
+        index, bit = divmod(record_id, 8)
+        with self._lock:
+            if index >= len(self._bitmap):
+                self._grow(index + 1)
+            self._bitmap[index] |= 1 << bit
+
+    def seen(self, record: dict):
+        """
+        Tell whether a record has already been ingested, counting it as skipped if so.
+        """
+        if record["id"] in self:
+            with self._lock:
+                self.skipped += 1
+            return True
+        return False
+
+    def skip_seen(self, records):
+        """
+        Drop the records whose id has already been ingested.
+
+        Args:
+            records (iterable of dict): The records read from the input.
+
+        Yields:
+            dict: The records not ingested yet.
+        """
+        for record in records:
+            if not self.seen(record):
+                yield record
+
+    def on_complete(self, records, outcomes):
+        """
+        Mark the successfully processed records of a completed request as ingested.
+        """
+        for record, success in zip(records, outcomes):
+            if success:
+                self.add(record["id"])
+
+    def close(self):
+        """
+        Flush the bitmap to disk and close the file.
+        """
+        with self._lock:
+            self._bitmap.flush()
+            self._bitmap.close()
+            os.close(self._fd)
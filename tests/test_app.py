@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+import app
+
+
+class ProcessRecordsTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_rejects_batches_with_non_object_elements(self):
+        with mock.patch.object(app, "handle_record") as handle_record:
+            for body in ([1, 2], [{"id": 1}, "2"], {"id": 1}):
+                response = self.client.post("/process_records", json=body)
+                self.assertEqual(response.status_code, 400, body)
+
+        # No record of a rejected batch is processed
+        handle_record.assert_not_called()
+
+    def test_returns_one_result_per_record(self):
+        with mock.patch.object(
+            app, "handle_record", return_value=({"status": "success"}, 200)
+        ):
+            response = self.client.post("/process_records", json=[{"id": 1}, {"id": 2}])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (result["id"], result["status_code"])
+                for result in response.json["results"]
+            ],
+            [(1, 200), (2, 200)],
+        )
+
+
+class CheckConfigurationTest(unittest.TestCase):
+    def test_exits_on_invalid_compression(self):
+        with mock.patch.dict(
+            "os.environ", {"ANALYTICS_COMPRESSION": "brotli"}
+        ), self.assertLogs("app", level="ERROR"), self.assertRaises(
+            SystemExit
+        ) as exit_info:
+            app.check_configuration()
+
+        self.assertEqual(exit_info.exception.code, 1)
+
+    def test_exits_on_unknown_json_backend(self):
+        with mock.patch.dict(
+            "os.environ", {"JSON_BACKEND": "simplejson"}
+        ), self.assertLogs("app", level="ERROR"), self.assertRaises(
+            SystemExit
+        ) as exit_info:
+            app.check_configuration()
+
+        self.assertEqual(exit_info.exception.code, 1)
+
+
+class WarmConnectionPoolsTest(unittest.TestCase):
+    def test_warms_enrichment_only_with_authentication(self):
+        environ = {
+            "ENRICHMENT_URL": "http://enrichment/enrich",
+            "ANALYTICS_URL": "http://analytics/analytics",
+        }
+        with mock.patch.dict("os.environ", environ), mock.patch.object(
+            app, "warm_session"
+        ) as warm_session:
+            app.warm_connection_pools()
+
+        warm_session.assert_called_once_with(
+            "ENRICHMENT", "http://enrichment/enrich", headers=app.AUTH_HEADER
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import gzip
+import unittest
+
+from body_encoding import encode_json_body
+
+
+class EncodeJsonBodyTest(unittest.TestCase):
+    def test_compresses_large_bodies(self):
+        body, headers = encode_json_body({"key": "x" * 100}, "gzip", min_size=10)
+
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), b'{"key":"' + b"x" * 100 + b'"}')
+
+    def test_rejects_unknown_compression(self):
+        # Whatever the body size, rather than sending it mislabelled
+        for min_size in (0, 1 << 20):
+            with self.assertRaises(ValueError):
+                encode_json_body({"key": "value"}, "brotli", min_size=min_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
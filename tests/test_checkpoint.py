@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+
+from checkpoint import Checkpoint
+
+
+def records_with_offsets(count: int):
+    return [((index + 1) * 10, {"id": index}) for index in range(count)]
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "ingest.ckpt")
+        self.input_path = os.path.join(self.tmp_dir.name, "input.csv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def saved_state(self, checkpoint: Checkpoint):
+        checkpoint.save()
+        with open(file=self.path, mode="r", encoding="utf8") as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def test_advances_over_contiguous_acknowledged_records(self):
+        checkpoint = Checkpoint(self.path, self.input_path)
+        records = list(checkpoint.track(records_with_offsets(3)))
+
+        checkpoint.on_complete([records[1]], [True])
+        self.assertEqual(checkpoint.offset, 0)
+        checkpoint.on_complete([records[0], records[2]], [True, True])
+
+        state = self.saved_state(checkpoint)
+        self.assertEqual(
+            (state["offset"], state["last_id"], state["records"]), (30, 2, 3)
+        )
+        self.assertEqual(checkpoint.pending, {})
+
+    def test_stops_at_first_failed_record(self):
+        checkpoint = Checkpoint(self.path, self.input_path)
+        records = list(checkpoint.track(records_with_offsets(4)))
+
+        checkpoint.on_complete(records[2:], [True, True])
+        checkpoint.on_complete(records[:2], [True, False])
+
+        state = self.saved_state(checkpoint)
+        self.assertEqual(
+            (state["offset"], state["last_id"], state["records"]), (10, 0, 1)
+        )
+        self.assertEqual(checkpoint.settled, {})
+
+    def test_settles_failures_recorded_elsewhere(self):
+        checkpoint = Checkpoint(self.path, self.input_path, settle_failures=True)
+        records = list(checkpoint.track(records_with_offsets(2)))
+
+        checkpoint.on_complete(records, [False, True])
+
+        self.assertEqual((checkpoint.offset, checkpoint.records), (20, 2))
+
+    def test_load_rejects_another_input_file(self):
+        Checkpoint(self.path, self.input_path).save()
+
+        with self.assertRaises(ValueError):
+            Checkpoint(self.path, self.input_path + ".other").load()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from cli_ingestion import parse_arguments
+from dead_letter import DeadLetterFile, read_dead_letters
+
+RECORDS = [
+    {"id": 1, "category": "phishing", "asset": "srv-1"},
+    {"id": 2, "category": "validaccounts", "asset": "srv-é"},
+]
+
+
+class DeadLetterFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "failed.ndjson")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_records(self):
+        dead_letters = DeadLetterFile(self.path)
+        dead_letters.write(RECORDS[0], "timeout", 4)
+        dead_letters.write(RECORDS[1], "http_400", 1)
+        dead_letters.close()
+        return dead_letters
+
+    def test_round_trip(self):
+        dead_letters = self.write_records()
+
+        self.assertEqual(dead_letters.written, 2)
+        self.assertEqual(list(read_dead_letters(self.path)), RECORDS)
+        with open(file=self.path, mode="r", encoding="utf8") as lines:
+            entry = json.loads(next(lines))
+        self.assertEqual(entry["error"], "timeout")
+        self.assertEqual(entry["attempts"], 4)
+        self.assertIn("failed_at", entry)
+
+    def test_appends_to_an_existing_file(self):
+        self.write_records()
+        self.write_records()
+
+        self.assertEqual(list(read_dead_letters(self.path)), RECORDS * 2)
+
+    def test_skips_malformed_lines(self):
+        self.write_records()
+        with open(file=self.path, mode="ab") as dead_letter_file:
+            dead_letter_file.write(
+                b'{"record": {"id": 3\n\n{"error": "timeout"}\n[1]\n'
+            )
+        self.write_records()
+
+        with self.assertLogs("dead_letter", level="ERROR") as logs:
+            records = list(read_dead_letters(self.path))
+
+        self.assertEqual(records, RECORDS * 2)
+        self.assertEqual(len(logs.records), 3)
+        self.assertIn("line 3", logs.output[0])
+
+    def test_reads_compressed_files(self):
+        self.write_records()
+        with open(file=self.path, mode="rb") as dead_letter_file:
+            compressed = gzip.compress(dead_letter_file.read())
+        with open(file=f"{self.path}.gz", mode="wb") as compressed_file:
+            compressed_file.write(compressed)
+
+        self.assertEqual(list(read_dead_letters(f"{self.path}.gz")), RECORDS)
+
+
+class ReplayArgumentsTest(unittest.TestCase):
+    def test_replay_options(self):
+        args = parse_arguments(
+            ["replay", "failed.ndjson", "failed.ndjson", "--concurrency", "4"]
+        )
+
+        self.assertEqual(args.command, "replay")
+        self.assertEqual(args.input_files, ["failed.ndjson"])
+        self.assertEqual(args.concurrency, 4)
+        # The CSV reader options do not apply to dead-letter files
+        self.assertIsNone(args.filter)
+        self.assertEqual(args.workers, 1)
+        self.assertIsNone(args.checkpoint)
+
+    def test_rejects_dead_letter_file_among_inputs(self):
+        argv = ["replay", "failed.ndjson", "--dead-letter"]
+        for dead_letter in ("failed.ndjson", os.path.abspath("failed.ndjson")):
+            with mock.patch("sys.stderr", io.StringIO()) as stderr, self.assertRaises(
+                SystemExit
+            ) as exit_info:
+                parse_arguments(argv + [dead_letter])
+
+            self.assertEqual(exit_info.exception.code, 2)
+            self.assertIn(
+                "--dead-letter must not be one of the input files", stderr.getvalue()
+            )
+
+    def test_accepts_another_dead_letter_file(self):
+        args = parse_arguments(
+            ["replay", "failed.ndjson", "--dead-letter", "failed-again.ndjson"]
+        )
+
+        self.assertEqual(args.dead_letter, "failed-again.ndjson")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+from unittest import mock
+
+import http_pool
+
+
+class WarmSessionTest(unittest.TestCase):
+    def test_opens_at_most_the_configured_pool_size(self):
+        session = mock.Mock()
+        with mock.patch.object(
+            http_pool, "get_session", return_value=session
+        ), mock.patch.dict("os.environ", {"MICROSERVICE_POOL_SIZE": "4"}):
+            http_pool.warm_session(
+                "MICROSERVICE", "http://service/process_record", connections=2000
+            )
+
+        self.assertEqual(session.options.call_count, 4)
+        session.head.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
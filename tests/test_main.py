@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import cli_ingestion
+
+
+class MainConfigurationErrorsTest(unittest.TestCase):
+    """
+    Configuration errors must exit with a non-zero status, e.g. for cron.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "input.csv")
+        with open(file=self.csv_path, mode="w", encoding="utf8") as csv_file:
+            csv_file.write("id;category\n1;Phishing\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @staticmethod
+    def missing():
+        raise ImportError("No module named 'ujson'")
+
+    def run_main(self, environ: dict, *options):
+        environ = {"MICROSERVICE_PATH": "http://localhost:1/process_record", **environ}
+        with mock.patch.dict("os.environ", environ), mock.patch(
+            "sys.argv", ["cli_ingestion.py", self.csv_path, *options]
+        ), mock.patch("dotenv.load_dotenv"), mock.patch(
+            "http_pool.warm_session"
+        ), self.assertLogs(
+            "cli_ingestion", level="ERROR"
+        ), self.assertRaises(
+            SystemExit
+        ) as exit_info:
+            cli_ingestion.main()
+        return exit_info.exception.code
+
+    def test_invalid_compression(self):
+        self.assertEqual(self.run_main({"MICROSERVICE_COMPRESSION": "lz4"}), 1)
+
+    def test_json_backend_not_installed(self):
+        with mock.patch.dict("json_codec.CODEC_FACTORIES", {"ujson": self.missing}):
+            self.assertEqual(self.run_main({"JSON_BACKEND": "ujson"}), 1)
+
+    def test_unknown_json_backend(self):
+        self.assertEqual(self.run_main({"JSON_BACKEND": "simplejson"}), 1)
+
+    def test_missing_microservice_path(self):
+        self.assertEqual(self.run_main({"MICROSERVICE_PATH": ""}), 1)
+
+    def test_invalid_unix_url(self):
+        self.assertEqual(self.run_main({"MICROSERVICE_PATH": "unix:///tmp/sock"}), 1)
+
+    def test_batch_size_without_batch_endpoint(self):
+        environ = {"MICROSERVICE_PATH": "http://localhost:1/api/ingest"}
+        self.assertEqual(self.run_main(environ, "--batch-size", "10"), 1)
+
+    def test_checkpoint_of_another_file(self):
+        checkpoint_path = os.path.join(self.tmp_dir.name, "ingest.ckpt")
+        with open(file=checkpoint_path, mode="w", encoding="utf8") as checkpoint_file:
+            json.dump(
+                {"file": "/other.csv", "offset": 0, "last_id": None, "records": 0},
+                checkpoint_file,
+            )
+
+        self.assertEqual(self.run_main({}, "--checkpoint", checkpoint_path), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from unittest import mock
+
+import rate_limiter
+from rate_limiter import TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    """
+    Stands in for the time module of rate_limiter: time only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1_700_000_000.0 + self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+
+
+class RetryAfterSecondsTest(unittest.TestCase):
+    def test_seconds(self):
+        self.assertEqual(retry_after_seconds("2.5"), 2.5)
+        self.assertEqual(retry_after_seconds("-3"), 0.0)
+
+    def test_http_date(self):
+        clock = FakeClock()
+        later = datetime.fromtimestamp(clock.time() + 30, tz=timezone.utc)
+        with mock.patch.object(rate_limiter, "time", clock):
+            self.assertAlmostEqual(
+                retry_after_seconds(format_datetime(later, usegmt=True)), 30.0
+            )
+
+    def test_missing_or_invalid(self):
+        for value in (None, "", "soon"):
+            self.assertIsNone(retry_after_seconds(value), value)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        # The throttling warnings are expected
+        for patcher in (
+            mock.patch.object(rate_limiter, "time", self.clock),
+            mock.patch.object(rate_limiter, "logger"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_burst_then_reservations_queue_up(self):
+        bucket = TokenBucket(rate=10, burst=2)
+
+        for _ in range(4):
+            bucket.acquire()
+
+        # The burst is free, then each caller waits behind the previous reservation
+        self.assertEqual(len(self.clock.sleeps), 2)
+        self.assertAlmostEqual(self.clock.sleeps[0], 0.1)
+        self.assertAlmostEqual(self.clock.sleeps[1], 0.2)
+
+    def test_refills_up_to_the_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        bucket.acquire(2)
+        self.clock.now += 60
+
+        bucket.acquire(2)
+        bucket.acquire()
+
+        self.assertEqual(len(self.clock.sleeps), 1)
+        self.assertAlmostEqual(self.clock.sleeps[0], 0.1)
+
+    def test_throttle_pauses_and_halves_the_rate(self):
+        bucket = TokenBucket(rate=100, burst=100)
+
+        bucket.observe(429)
+        self.assertEqual(bucket.rate, 50)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.sleeps[-1], 1.0)
+
+        # Consecutive throttles double the pause
+        bucket.observe(503)
+        self.assertEqual(bucket.rate, 25)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.sleeps[-1], 2.0)
+
+    def test_throttle_honours_retry_after(self):
+        bucket = TokenBucket(rate=100, burst=100)
+
+        bucket.observe(429, "7")
+        bucket.acquire()
+
+        self.assertAlmostEqual(self.clock.sleeps[-1], 7.0)
+
+    def test_rate_has_a_floor(self):
+        bucket = TokenBucket(rate=100)
+
+        for _ in range(20):
+            bucket.on_throttled(0.0)
+
+        self.assertEqual(bucket.rate, 100 * rate_limiter.MIN_RATE_FRACTION)
+
+    def test_successes_recover_the_rate_and_the_pause(self):
+        bucket = TokenBucket(rate=100)
+        bucket.observe(429)
+        bucket.observe(429)
+
+        bucket.observe(200)
+        self.assertEqual(bucket.rate, 26)
+        self.assertEqual(bucket.throttle_pause, rate_limiter.DEFAULT_THROTTLE_PAUSE)
+        for _ in range(200):
+            bucket.observe(200)
+        self.assertEqual(bucket.rate, 100)
+
+    def test_other_errors_do_not_change_the_rate(self):
+        bucket = TokenBucket(rate=100)
+        bucket.observe(429)
+
+        bucket.observe(500)
+
+        self.assertEqual(bucket.rate, 50)
+
+    def test_unlimited_rate_only_pauses(self):
+        bucket = TokenBucket()
+        for _ in range(1000):
+            bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+        bucket.observe(429, "3")
+        bucket.acquire()
+
+        self.assertIsNone(bucket.rate)
+        self.assertEqual(self.clock.sleeps, [3.0])
+
+    def test_acquire_async_waits_without_blocking(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        with mock.patch("asyncio.sleep", new=mock.AsyncMock()) as sleep:
+            asyncio.run(bucket.acquire_async())
+            asyncio.run(bucket.acquire_async())
+
+        sleep.assert_awaited_once()
+        self.assertAlmostEqual(sleep.await_args.args[0], 0.1)
+        self.assertEqual(self.clock.sleeps, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
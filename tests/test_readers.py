@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import cli_ingestion
+from cli_ingestion import (
+    csv_byte_ranges,
+    read_csv_file,
+    read_csv_file_mmap,
+    read_csv_file_sharded,
+    read_csv_range,
+    reader_blocks,
+)
+
+
+class ReadersTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "input.csv")
+        categories = ["Phishing", "nope", "Valid Accounts"]
+        with open(file=self.csv_path, mode="w", encoding="utf8") as csv_file:
+            csv_file.write("id;created_utc;source;category;asset_name;ip\n")
+            for index in range(3000):
+                csv_file.write(
+                    f"{index};2024-01-01;src;{categories[index % 3]};srv-{index};"
+                    f"10.0.0.{index % 256}\n"
+                )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_readers_build_the_same_records(self):
+        records = list(read_csv_file(self.csv_path))
+
+        self.assertEqual(len(records), 2000)
+        self.assertEqual(
+            dict(records[0]),
+            {"category": "phishing", "ip": "10.0.0.0", "asset": "srv-0", "id": 0},
+        )
+        self.assertEqual(list(read_csv_file_mmap(self.csv_path)), records)
+
+    def test_mmap_reader_matches_csv_reader_across_blocks(self):
+        with open(
+            file=self.csv_path, mode="w", encoding="utf8", newline=""
+        ) as csv_file:
+            csv_file.write("id;created_utc;source;category;asset_name;ip\r\n")
+            for index in range(3000):
+                category = ["Phishing", "nope", '"Valid;Accounts"'][index % 3]
+                extra = ";extra" if index % 7 == 0 else ""
+                csv_file.write(
+                    f"{index};2024-01-01;src;{category};srv-{index % 5}{extra}\r\n"
+                )
+
+        # Many blocks, each released once split
+        with mock.patch.object(cli_ingestion, "MMAP_BLOCK_SIZE", 4096):
+            for filter_values in (None, ["category=phishing"], ["asset=srv-1"]):
+                expected = [
+                    dict(row) for row in read_csv_file(self.csv_path, filter_values)
+                ]
+                records = [
+                    dict(row)
+                    for row in read_csv_file_mmap(self.csv_path, filter_values)
+                ]
+                self.assertTrue(expected)
+                self.assertEqual(records, expected)
+
+    def test_ranges_send_values_instead_of_records(self):
+        fieldnames, ranges = csv_byte_ranges(self.csv_path, 1)
+        keys, rows, counts = read_csv_range(self.csv_path, fieldnames, *ranges[0])
+
+        self.assertEqual(keys, ("category", "ip", "asset", "id"))
+        self.assertEqual(rows[0], ("phishing", "10.0.0.0", "srv-0", 0))
+        self.assertTrue(all(type(row) is tuple for row in rows))
+        self.assertEqual(counts, {"passed": 2000, "invalid_category": 1000})
+
+    def test_blocking_readers(self):
+        gzip_path = os.path.join(self.tmp_dir.name, "input.csv.gz")
+        args = mock.Mock(workers=1)
+
+        self.assertFalse(reader_blocks(self.csv_path, args))
+        self.assertTrue(reader_blocks(gzip_path, args))
+        self.assertTrue(reader_blocks("-", args))
+        self.assertTrue(reader_blocks(self.csv_path, mock.Mock(workers=2)))
+
+    def test_sharded_reader_streams_small_ranges(self):
+        expected = list(read_csv_file(self.csv_path))
+
+        # Many more ranges than are allowed in flight at once
+        with mock.patch.object(cli_ingestion, "SHARD_MAX_SIZE", 1024):
+            ordered = list(read_csv_file_sharded(self.csv_path, workers=2))
+            unordered = list(
+                read_csv_file_sharded(self.csv_path, workers=2, ordered=False)
+            )
+
+        self.assertEqual(ordered, expected)
+        self.assertEqual(
+            sorted(record["id"] for record in unordered),
+            [record["id"] for record in expected],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from record_filter import compile_filter
+
+ROW = {"category": "phishing", "ip": "10.0.0.1", "asset": "srv-12", "id": 42}
+
+
+class CompileFilterTest(unittest.TestCase):
+    def test_bare_value_matches_any_column(self):
+        matches = compile_filter(["srv-12"])
+
+        self.assertTrue(matches(ROW))
+        self.assertFalse(matches({**ROW, "asset": "srv-13"}))
+        self.assertIsNone(matches.columns)
+
+    def test_equality_matches_cast_id(self):
+        self.assertTrue(compile_filter(["id=42"])(ROW))
+        self.assertFalse(compile_filter(["id=43"])(ROW))
+        self.assertTrue(compile_filter(["category!=validaccounts"])(ROW))
+        self.assertFalse(compile_filter(["category!=phishing"])(ROW))
+
+    def test_comparisons_and_regexes(self):
+        self.assertTrue(compile_filter(["id>41"])(ROW))
+        self.assertFalse(compile_filter(["id<=41"])(ROW))
+        self.assertFalse(compile_filter(["ip>1"])(ROW))
+        self.assertTrue(compile_filter(["asset~^srv-1"])(ROW))
+        self.assertFalse(compile_filter(["asset~^db-"])(ROW))
+
+    def test_any_expression_matches(self):
+        matches = compile_filter(["category=validaccounts", "id>=42"])
+
+        self.assertTrue(matches(ROW))
+        self.assertEqual(matches.columns, {"category", "id"})
+
+    def test_missing_column_does_not_match(self):
+        self.assertFalse(compile_filter(["user=alice", "user!=bob"])(ROW))
+
+    def test_invalid_expressions(self):
+        with self.assertRaises(ValueError):
+            compile_filter(["id>many"])
+        with self.assertRaises(ValueError):
+            compile_filter(["asset~("])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import pickle
+import unittest
+
+import json_codec
+from record_type import Record, record_type
+
+
+class RecordTypeTest(unittest.TestCase):
+    def test_reads_like_a_dict(self):
+        record = record_type(("category", "asset", "id"))("phishing", "srv-1", 1)
+
+        self.assertIsInstance(record, Record)
+        self.assertEqual(record["id"], 1)
+        self.assertEqual(record.get("ip", "-"), "-")
+        self.assertIn("asset", record)
+        self.assertEqual(
+            dict(record), {"category": "phishing", "asset": "srv-1", "id": 1}
+        )
+        self.assertEqual(record, {"category": "phishing", "asset": "srv-1", "id": 1})
+        with self.assertRaises(KeyError):
+            record["ip"]
+
+    def test_one_type_per_keys(self):
+        self.assertIs(record_type(("category", "id")), record_type(("category", "id")))
+
+    def test_keys_that_cannot_be_attributes(self):
+        for keys in (
+            ("id", "asset name"),
+            ("id", "class"),
+            ("id", "items"),
+            ("id", None),
+        ):
+            self.assertIsNone(record_type(keys))
+
+    def test_pickles_and_serializes(self):
+        record = record_type(("category", "id"))("phishing", 7)
+
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+        for backend in json_codec.JSON_BACKENDS:
+            try:
+                _, dumps, _ = json_codec.load_codec(backend)
+            except ImportError:
+                continue
+            self.assertEqual(dumps([record]), b'[{"category":"phishing","id":7}]')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from cli_ingestion import send_batch_to_microservice
+from retry_policy import RetryPolicy, is_retryable
+
+
+class IsRetryableTest(unittest.TestCase):
+    def test_transient_errors_are_retried(self):
+        for error in ("timeout", "connection", "http_408", "http_429", "http_503"):
+            self.assertTrue(is_retryable(error), error)
+
+    def test_permanent_errors_are_not_retried(self):
+        for error in ("request_error", "invalid_response", "http_400", "http_404"):
+            self.assertFalse(is_retryable(error), error)
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_delay_is_bounded(self):
+        policy = RetryPolicy(retries=5, backoff=1.0, max_backoff=3.0)
+        started = time.monotonic()
+
+        for attempt in range(5):
+            self.assertLessEqual(policy.delay(attempt, started), min(3.0, 2**attempt))
+        self.assertIsNone(policy.delay(5, started))
+
+    def test_deadline(self):
+        policy = RetryPolicy(retries=5, backoff=0.0, deadline=10.0)
+
+        self.assertIsNotNone(policy.delay(0, time.monotonic()))
+        self.assertIsNone(policy.delay(0, time.monotonic() - 10.0))
+
+
+class SendBatchRetryTest(unittest.TestCase):
+    def send(self, side_effect):
+        session = mock.Mock()
+        session.post.side_effect = side_effect
+        failures = []
+        with mock.patch.dict(
+            "os.environ", {"MICROSERVICE_PATH": "http://localhost/process_record"}
+        ), mock.patch("http_pool.get_session", return_value=session):
+            outcomes = send_batch_to_microservice(
+                [{"id": 1}],
+                retry_policy=RetryPolicy(retries=3, backoff=0.0),
+                on_failure=lambda *failure: failures.append(failure),
+            )
+        return outcomes, session.post.call_count, failures
+
+    def test_invalid_url_is_not_retried(self):
+        outcomes, attempts, failures = self.send(requests.exceptions.InvalidURL())
+
+        self.assertEqual((outcomes, attempts), ([False], 1))
+        self.assertEqual(failures, [({"id": 1}, "request_error", 1)])
+
+    def test_dropped_connection_is_retried(self):
+        outcomes, attempts, _ = self.send(requests.exceptions.ChunkedEncodingError())
+
+        self.assertEqual((outcomes, attempts), ([False], 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+
+from checkpoint import Checkpoint
+from cli_ingestion import IngestionContext, open_records, parse_arguments
+from rate_limiter import TokenBucket
+from seen_ids import SeenIds
+
+
+class SeenIdsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.seen_path = os.path.join(self.tmp_dir.name, "seen.bin")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_skips_and_persists_ingested_ids(self):
+        seen_ids = SeenIds(self.seen_path)
+        seen_ids.on_complete([{"id": 1}, {"id": 2}], [True, False])
+        seen_ids.close()
+
+        seen_ids = SeenIds(self.seen_path)
+        records = list(seen_ids.skip_seen([{"id": 1}, {"id": 2}, {"id": "x"}]))
+        seen_ids.close()
+
+        self.assertEqual(records, [{"id": 2}, {"id": "x"}])
+        self.assertEqual(seen_ids.skipped, 1)
+
+
+class SeenIdsWithCheckpointTest(unittest.TestCase):
+    """
+    --seen-ids with --checkpoint: skipped records must not hold the checkpoint back.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, "input.csv")
+        self.checkpoint_path = os.path.join(self.tmp_dir.name, "ingest.ckpt")
+        self.seen_path = os.path.join(self.tmp_dir.name, "seen.bin")
+        with open(file=self.csv_path, mode="w", encoding="utf8") as csv_file:
+            csv_file.write("id;created_utc;source;category;asset_name;ip\n")
+            for index in range(100):
+                csv_file.write(
+                    f"{index};2024-01-01;src;Phishing;srv-{index};10.0.0.1\n"
+                )
+            self.size = csv_file.tell()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_checkpoint_moves_past_skipped_records(self):
+        seen_ids = SeenIds(self.seen_path)
+        # Every other record of the first 80 was ingested by a previous run
+        seen_ids.on_complete([{"id": index} for index in range(0, 80, 2)], [True] * 40)
+
+        args = parse_arguments(
+            [
+                self.csv_path,
+                "--checkpoint",
+                self.checkpoint_path,
+                "--seen-ids",
+                self.seen_path,
+            ]
+        )
+        checkpoint = Checkpoint(self.checkpoint_path, self.csv_path)
+        context = IngestionContext(args, TokenBucket(), checkpoint, seen_ids)
+
+        sent = []
+        for record in open_records(self.csv_path, context):
+            sent.append(record["id"])
+            context.on_complete([record], [True])
+        checkpoint.save()
+        seen_ids.close()
+
+        self.assertEqual(len(sent), 60)
+        self.assertEqual(seen_ids.skipped, 40)
+        self.assertEqual(checkpoint.pending, {})
+        with open(file=self.checkpoint_path, mode="r", encoding="utf8") as state_file:
+            state = json.load(state_file)
+        self.assertEqual(
+            (state["offset"], state["last_id"], state["records"]), (self.size, 99, 60)
+        )
+
+    def test_checkpoint_moves_past_trailing_skipped_records(self):
+        seen_ids = SeenIds(self.seen_path)
+        seen_ids.on_complete([{"id": index} for index in range(20, 100)], [True] * 80)
+        checkpoint = Checkpoint(self.checkpoint_path, self.csv_path)
+        args = parse_arguments([self.csv_path, "--checkpoint", self.checkpoint_path])
+        context = IngestionContext(args, TokenBucket(), checkpoint, seen_ids)
+
+        for record in open_records(self.csv_path, context):
+            context.on_complete([record], [True])
+        seen_ids.close()
+
+        self.assertEqual((checkpoint.offset, checkpoint.records), (self.size, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+import json_codec
+from cli_ingestion import (
+    batch_errors,
+    microservice_batch_path,
+    microservice_request,
+    post_to_microservice,
+)
+
+RECORDS = [{"id": 1, "category": "phishing"}, {"id": 2, "category": "phishing"}]
+
+
+def response(status_code: int, body):
+    return mock.Mock(
+        status_code=status_code,
+        headers={},
+        content=json_codec.dumps(body),
+        raise_for_status=mock.Mock(),
+    )
+
+
+class MicroserviceBatchPathTest(unittest.TestCase):
+    def batch_path(self, environ: dict):
+        with mock.patch.dict("os.environ", environ, clear=True):
+            return microservice_batch_path()
+
+    def test_derived_from_the_single_record_endpoint(self):
+        for path in ("http://host/process_record", "http://host/process_record/"):
+            self.assertEqual(
+                self.batch_path({"MICROSERVICE_PATH": path}),
+                "http://host/process_records",
+            )
+
+    def test_not_derived_from_other_paths(self):
+        for path in ("http://host/api/ingest", "http://host/process_record?key=1"):
+            self.assertIsNone(self.batch_path({"MICROSERVICE_PATH": path}))
+
+    def test_explicit_batch_path(self):
+        environ = {
+            "MICROSERVICE_PATH": "http://host/api/ingest",
+            "MICROSERVICE_BATCH_PATH": "http://host/api/ingest-batch",
+        }
+        self.assertEqual(self.batch_path(environ), "http://host/api/ingest-batch")
+
+
+class BatchErrorsTest(unittest.TestCase):
+    def test_errors_per_record(self):
+        results = [{"status_code": 200}, {"status_code": 503}]
+
+        self.assertEqual(batch_errors(RECORDS, results), [None, "http_503"])
+
+    def test_rejects_missing_results(self):
+        with self.assertRaises(ValueError):
+            batch_errors(RECORDS, [{"status_code": 200}])
+
+
+class PostToMicroserviceTest(unittest.TestCase):
+    def post(self, body):
+        session = mock.Mock()
+        session.post.return_value = response(200, body)
+        with mock.patch.dict(
+            "os.environ", {"MICROSERVICE_PATH": "http://localhost/process_record"}
+        ), mock.patch("http_pool.get_session", return_value=session):
+            return post_to_microservice(RECORDS, microservice_request(RECORDS))
+
+    def test_batch_results(self):
+        results = [{"status_code": 200}, {"status_code": 400}]
+
+        self.assertEqual(self.post({"results": results}), [None, "http_400"])
+
+    def test_short_results_fail_every_record(self):
+        results = [{"status_code": 200}]
+
+        self.assertEqual(self.post({"results": results}), ["invalid_response"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()